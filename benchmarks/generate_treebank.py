@@ -0,0 +1,128 @@
+"""generates a synthetic treebank in CONLL-U format for benchmarking
+
+the word forms follow a Zipf-Mandelbrot distribution, every form has a fixed part-of-speech tag (the frequent forms are
+function words and punctuation), the sentence lengths follow a log-normal distribution and the dependency trees are
+valid trees whose heads prefer close tokens; the labels are determined by the tags and the direction of a dependency
+and replaced by a random label with the given noise probability
+
+usage: python benchmarks/generate_treebank.py sentences [--vocab 50000] [--zipf 1.0] [--shift 2.7] [--noise 0.05]
+                                              [--seed 1] [--output file]"""
+
+import argparse
+import itertools
+import random
+import sys
+
+
+FUNCTION_TAGS = ['DET', 'ADP', 'PUNCT', 'PRON', 'CCONJ', 'AUX', 'PART']
+CONTENT_TAGS = ['NOUN', 'VERB', 'ADJ', 'ADV', 'PROPN', 'NUM']
+CONTENT_WEIGHTS = [40, 20, 15, 10, 10, 5]
+LABELS = ['nsubj', 'obj', 'iobj', 'obl', 'nmod', 'amod', 'advmod', 'det', 'case', 'cc', 'conj', 'aux', 'mark',
+          'compound', 'appos', 'nummod', 'xcomp', 'ccomp', 'acl', 'advcl']
+PUNCTUATION = [',', '.', ':', ';', '"', '(', ')', '?', '!', '-']
+
+# the number of most frequent forms that are function words
+FUNCTION_WORDS = 120
+
+
+class TreebankGenerator:
+    """draws random sentences with the distributions described above"""
+
+    def __init__(self, vocab: int = 50000, zipf: float = 1.0, shift: float = 2.7, noise: float = 0.05, seed: int = 1):
+        self.random = random.Random(seed)
+        self.noise = noise
+
+        self.forms = list()
+        self.tags = list()
+        for rank in range(vocab):
+            if rank < FUNCTION_WORDS:
+                tag = FUNCTION_TAGS[rank % len(FUNCTION_TAGS)]
+            else:
+                tag = self.random.choices(CONTENT_TAGS, CONTENT_WEIGHTS)[0]
+            if tag == 'PUNCT':
+                form = PUNCTUATION[rank // len(FUNCTION_TAGS) % len(PUNCTUATION)]
+            else:
+                form = 'w{}'.format(rank)
+            self.forms.append(form)
+            self.tags.append(tag)
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 1 + shift) ** zipf for rank in range(vocab)))
+
+        # the label of a dependency follows from the tags and the direction
+        self.labels = dict()
+        for dependent in FUNCTION_TAGS + CONTENT_TAGS:
+            for head in FUNCTION_TAGS + CONTENT_TAGS:
+                for left in (True, False):
+                    self.labels[(dependent, head, left)] = self.random.choice(LABELS)
+
+    def sentence_length(self) -> int:
+        return max(1, min(80, round(self.random.lognormvariate(2.6, 0.55))))
+
+    def sentence(self) -> list:
+        """returns the tokens of a sentence as (form, tag, head, label) with 1-based heads"""
+        r = self.random
+        words = r.choices(range(len(self.forms)), cum_weights=self.cum_weights, k=self.sentence_length())
+        tags = [self.tags[w] for w in words]
+        content = [i for i, tag in enumerate(tags) if tag != 'PUNCT']
+        if not content:
+            # a sentence needs a token which can be its root
+            words[0] = FUNCTION_WORDS
+            tags[0] = self.tags[FUNCTION_WORDS]
+            content = [0]
+
+        # the tokens are attached one by one to tokens of the tree, which makes it acyclic
+        root = r.choice(content)
+        heads = [0] * len(words)
+        attached = [root]
+        others = [i for i in range(len(words)) if i != root]
+        r.shuffle(others)
+        for i in others:
+            weights = [1 / (i - j) ** 2 for j in attached]
+            heads[i] = r.choices(attached, weights)[0] + 1
+            if tags[i] != 'PUNCT':
+                attached.append(i)
+
+        tokens = list()
+        for i, word in enumerate(words):
+            if heads[i] == 0:
+                label = 'root'
+            elif tags[i] == 'PUNCT':
+                label = 'punct'
+            elif r.random() < self.noise:
+                label = r.choice(LABELS)
+            else:
+                label = self.labels[(tags[i], tags[heads[i] - 1], heads[i] - 1 > i)]
+            tokens.append((self.forms[word], tags[i], heads[i], label))
+        return tokens
+
+    def write(self, sentences: int, out):
+        out.write('# newdoc id = synthetic\n')
+        for s in range(sentences):
+            tokens = self.sentence()
+            out.write('# sent_id = {}\n'.format(s + 1))
+            out.write('# text = {}\n'.format(' '.join(token[0] for token in tokens)))
+            for i, (form, tag, head, label) in enumerate(tokens):
+                out.write('{}\t{}\t{}\t{}\t_\t_\t{}\t{}\t_\t_\n'.format(i + 1, form, form, tag, head, label))
+            out.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generates a synthetic treebank in CONLL-U format")
+    parser.add_argument('sentences', type=int)
+    parser.add_argument('--vocab', type=int, default=50000, help="number of distinct word forms")
+    parser.add_argument('--zipf', type=float, default=1.0, help="exponent of the distribution of the forms")
+    parser.add_argument('--shift', type=float, default=2.7, help="rank shift of the distribution of the forms")
+    parser.add_argument('--noise', type=float, default=0.05, help="probability of a random label")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="output file (default: standard output)")
+    args = parser.parse_args()
+
+    generator = TreebankGenerator(args.vocab, args.zipf, args.shift, args.noise, args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as out:
+            generator.write(args.sentences, out)
+    else:
+        generator.write(args.sentences, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
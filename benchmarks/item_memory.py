@@ -0,0 +1,113 @@
+"""measures the memory footprint of the items stored in the nuclei and NIL tries (bytes per item)
+next to the previous representation: a dict based Item with a set of label strings and NIL leaves as lists of Items
+
+usage: python benchmarks/item_memory.py [number of items]"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from trie import Trie, NilTrie, Item  # noqa: E402
+
+
+class BaselineItem:
+    """the previous Item, with a set of label strings and an instance dict (only the constructor is needed)"""
+
+    def __init__(self, sentence: int, word1: int, word2: int, label=None):
+        self.sentence = sentence
+        self.word1 = word1
+        self.word2 = word2
+        if isinstance(label, set):
+            self.label = set()
+            for la in label:
+                self.label.add(la)
+        else:
+            self.label = {label} if label else None
+
+
+def measure(build, n: int) -> float:
+    """returns the number of bytes allocated by build(n) per item"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(n)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return (after - before) / n
+
+
+def labelled_items(n: int):
+    """dependency items, as created by Trie.add_item()"""
+    labels = ['det-R', 'nsubj-R', 'obj-L', 'amod-R', 'case-R', 'root-L']
+    return [Item(i // 20, i % 20 + 1, i % 20 + 2, labels[i % len(labels)]) for i in range(n)]
+
+
+def overlapping_items(n: int):
+    """dependency items holding two labels"""
+    items = labelled_items(n)
+    for item in items:
+        item.add_label(Item(0, 0, 0, 'nmod-L').label_ids)
+    return items
+
+
+def nil_objects(n: int):
+    """NIL items kept as Item objects"""
+    return [Item(i // 20, i % 20 + 1, i % 20 + 2) for i in range(n)]
+
+
+def baseline_labelled_items(n: int):
+    labels = ['det-R', 'nsubj-R', 'obj-L', 'amod-R', 'case-R', 'root-L']
+    return [BaselineItem(i // 20, i % 20 + 1, i % 20 + 2, labels[i % len(labels)]) for i in range(n)]
+
+
+def baseline_overlapping_items(n: int):
+    items = baseline_labelled_items(n)
+    for item in items:
+        item.label.add('nmod-L')
+    return items
+
+
+def baseline_nil_objects(n: int):
+    return [BaselineItem(i // 20, i % 20 + 1, i % 20 + 2) for i in range(n)]
+
+
+def baseline_trie(n: int, label=None):
+    """the previous tries, dicts of dicts of lists of items (100 word pairs)"""
+    trie = dict()
+    for i in range(n):
+        trie.setdefault(i % 10, dict()).setdefault(i % 100 // 10, []).append(
+            BaselineItem(i // 20, i % 20 + 1, i % 20 + 2, label))
+    return trie
+
+
+def baseline_nuclei_trie(n: int):
+    return baseline_trie(n, 'det-R')
+
+
+def nil_trie(n: int):
+    """NIL items in the array backed leaves of the NIL trie (100 word pairs)"""
+    trie = NilTrie()
+    for i in range(n):
+        trie.add_item(i % 10, i % 100 // 10, i // 20, i % 20 + 1, i % 20 + 2)
+    return trie
+
+
+def nuclei_trie(n: int):
+    """labelled items in the nuclei trie (without detection, 100 word pairs)"""
+    trie = Trie(detect=False)
+    for i in range(n):
+        trie.add_item(i % 10, i % 100 // 10, i // 20, i % 20 + 1, i % 20 + 2, 'det-R')
+    return trie
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print("{:<20}{:>12}{:>12}".format('', 'before', 'after'))
+    for name, before, after in [('labelled Item', baseline_labelled_items, labelled_items),
+                                ('overlapping Item', baseline_overlapping_items, overlapping_items),
+                                ('NIL Item object', baseline_nil_objects, nil_objects),
+                                ('nuclei trie', baseline_nuclei_trie, nuclei_trie),
+                                ('NIL trie', baseline_trie, nil_trie)]:
+        print("{:<20}{:>12.1f}{:>12.1f}  bytes per item".format(name, measure(before, count), measure(after, count)))
@@ -0,0 +1,148 @@
+"""times and memory-profiles the phases of the error detection on synthetic treebanks of growing size
+every size runs in its own process, the metrics of ErrorDetector.detect_errors() are appended
+as one json line per size to the output file, together with the total time of some hot functions
+(a size whose process fails, e.g. runs out of memory, is recorded with its exit code)
+
+the raw variation nuclei grow quadratically with the corpus, for the large sizes the constants that avoid keeping
+them (--set STREAMING=true, --set HASH_JOIN=true) are needed
+
+usage: python benchmarks/phases.py [--sizes 1000,10000,100000,1000000] [--output benchmarks/results.jsonl]
+                                   [--data benchmarks/data] [--tracemalloc] [--set CONSTANT=value ...]"""
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, '..'))
+sys.path.insert(0, BENCHMARKS)
+
+import error_detection  # noqa: E402
+from error_detection import ErrorDetector  # noqa: E402
+from generate_treebank import TreebankGenerator  # noqa: E402
+from trie import Trie  # noqa: E402
+
+
+# functions which are timed in total across all their calls (the wrapper adds a little overhead to every call)
+TIMED_FUNCTIONS = ((ErrorDetector, 'collect_nil_items'), (ErrorDetector, 'collect_dependency_pair'),
+                   (Trie, 'add_item'))
+
+
+def instrument() -> dict:
+    """wraps the TIMED_FUNCTIONS, returns the dictionary their total times and calls are accumulated in"""
+    totals = dict()
+    for owner, name in TIMED_FUNCTIONS:
+        function = getattr(owner, name)
+        total = totals[owner.__name__ + '.' + name] = {'seconds': 0.0, 'calls': 0}
+
+        def timed(*args, _function=function, _total=total, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _function(*args, **kwargs)
+            finally:
+                _total['seconds'] += time.perf_counter() - start
+                _total['calls'] += 1
+        setattr(owner, name, functools.wraps(function)(timed))
+    return totals
+
+
+def run_phases(filename: str, trace: bool) -> dict:
+    """runs the error detection on the treebank and returns its metrics"""
+    detector = ErrorDetector()
+    totals = instrument()
+    output = tempfile.NamedTemporaryFile(suffix='.json', delete=False).name
+    error_detection.OUTPUT_FILE = output
+    error_detection.PROGRESS = 'none'
+    error_detection.TRACE_MEMORY = trace
+    try:
+        detector.detect_errors(filename)
+    finally:
+        os.remove(output)
+
+    result = detector.metrics.to_dict()
+    result['functions'] = {name: {'seconds': round(total['seconds'], 3), 'calls': total['calls']}
+                           for name, total in totals.items()}
+    return result
+
+
+def get_treebank(directory: str, sentences: int) -> str:
+    """returns the path of the synthetic treebank of the size, it is generated once (with the default settings)"""
+    filename = os.path.join(directory, 'synthetic-{}.conllu'.format(sentences))
+    if not os.path.exists(filename):
+        os.makedirs(directory, exist_ok=True)
+        with open(filename + '.tmp', 'w', encoding='utf8') as out:
+            TreebankGenerator().write(sentences, out)
+        os.replace(filename + '.tmp', filename)
+    return filename
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def apply_settings(settings: list):
+    """sets the constants of error_detection given as NAME=value"""
+    for setting in settings:
+        name, value = setting.split('=', 1)
+        if not hasattr(error_detection, name):
+            raise ValueError("unknown constant {}".format(name))
+        setattr(error_detection, name, json.loads(value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks the phases of the error detection")
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000', help="numbers of sentences")
+    parser.add_argument('--output', default=os.path.join(BENCHMARKS, 'results.jsonl'))
+    parser.add_argument('--data', default=os.path.join(BENCHMARKS, 'data'), help="directory of the treebanks")
+    parser.add_argument('--tracemalloc', action='store_true', help="also trace the python allocations (slower)")
+    parser.add_argument('--set', action='append', default=[], metavar='CONSTANT=value',
+                        help="sets a constant of error_detection, the value is given in json")
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    apply_settings(args.set)
+    if args.run:
+        # a single size in a fresh process, the detector prints its progress to stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_phases(args.run, args.tracemalloc)
+        print(json.dumps(result))
+        return
+
+    for size in [int(size) for size in args.sizes.split(',')]:
+        filename = get_treebank(args.data, size)
+        command = [sys.executable, os.path.abspath(__file__), '--run', filename]
+        command += ['--set=' + setting for setting in args.set]
+        if args.tracemalloc:
+            command.append('--tracemalloc')
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull:
+            completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=devnull, text=True)
+
+        result = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': get_commit(),
+                  'python': platform.python_version(), 'sentences': size, 'settings': args.set,
+                  'tracemalloc': args.tracemalloc}
+        if completed.returncode == 0:
+            result.update(json.loads(completed.stdout))
+            summary = ", ".join("{} {:.2f}s".format(phase, measurement['seconds'])
+                                for phase, measurement in result['phases'].items())
+        else:
+            result['error'] = {'exit_code': completed.returncode, 'seconds': round(time.perf_counter() - start, 3)}
+            summary = "failed with exit code {}".format(completed.returncode)
+        with open(args.output, 'a') as out:
+            out.write(json.dumps(result) + '\n')
+        print("{:>9} sentences: {}".format(size, summary))
+
+
+if __name__ == '__main__':
+    main()
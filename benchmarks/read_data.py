@@ -0,0 +1,102 @@
+"""benchmarks the CONLL-U reader of ErrorDetector.read_data() against the line by line reader it replaced
+on a synthetic treebank, uncompressed and compressed with gzip and xz; both readers have to build the same corpus
+
+usage: python benchmarks/read_data.py [--sentences 100000] [--data benchmarks/data] [--repeat 3]"""
+
+import argparse
+import gzip
+import lzma
+import os
+import shutil
+import sys
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, '..'))
+sys.path.insert(0, BENCHMARKS)
+
+from corpus import Corpus, open_treebank  # noqa: E402
+from phases import get_treebank  # noqa: E402
+
+
+def read_lines(corpus: Corpus, filename: str):
+    """the reader of read_data() before the bulk reader: text mode, line by line, all columns split"""
+    with open(filename, 'r', encoding='utf8') as f:
+        f.readline()  # ignore the 'newdoc' tag
+        line = f.readline()
+        open_sentence = False
+        while line:
+            if line == '\n':
+                corpus.end_sentence()
+                open_sentence = False
+            else:
+                line = line.split('\t', 8)
+                if not (line[0].startswith('#') or '-' in line[0]):
+                    corpus.add_token(line[1], line[3], line[6], line[7])
+                    open_sentence = True
+            line = f.readline()
+        if open_sentence:
+            corpus.end_sentence()
+    corpus.finalize()
+
+
+def read_bulk(corpus: Corpus, filename: str):
+    with open_treebank(filename) as f:
+        corpus.read_conllu(f)
+
+
+def compress(filename: str, opener, extension: str) -> str:
+    """returns the path of a compressed copy of the file, it is created once"""
+    compressed = filename + extension
+    if not os.path.exists(compressed):
+        with open(filename, 'rb') as source, opener(compressed + '.tmp', 'wb') as target:
+            shutil.copyfileobj(source, target, 1 << 20)
+        os.replace(compressed + '.tmp', compressed)
+    return compressed
+
+
+def get_columns(corpus: Corpus) -> tuple:
+    return (corpus.form.tolist(), corpus.upos.tolist(), corpus.head.tolist(), corpus.deprel.tolist(),
+            corpus.offsets.tolist(), corpus.vocab.strings, corpus.pos_tags.strings, corpus.labels.strings)
+
+
+def measure(reader, filename: str, repeat: int) -> tuple:
+    """returns the best time of the reader and the corpus it built"""
+    best = None
+    for _ in range(repeat):
+        corpus = Corpus()
+        start = time.perf_counter()
+        reader(corpus, filename)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks the CONLL-U readers")
+    parser.add_argument('--sentences', type=int, default=100000)
+    parser.add_argument('--data', default=os.path.join(BENCHMARKS, 'data'), help="directory of the treebanks")
+    parser.add_argument('--repeat', type=int, default=3, help="the best of this many runs is reported")
+    args = parser.parse_args()
+
+    filename = get_treebank(args.data, args.sentences)
+    size = os.path.getsize(filename) / 1e6
+    runs = [('line reader', read_lines, filename),
+            ('bulk reader', read_bulk, filename),
+            ('bulk reader (gzip)', read_bulk, compress(filename, gzip.open, '.gz')),
+            ('bulk reader (xz)', read_bulk, compress(filename, lzma.open, '.xz'))]
+
+    reference = None
+    for name, reader, path in runs:
+        seconds, corpus = measure(reader, path, args.repeat)
+        columns = get_columns(corpus)
+        if reference is None:
+            reference = columns
+        elif columns != reference:
+            raise AssertionError("the {} built a different corpus".format(name))
+        print("{:<20} {:>8.2f}s {:>8.1f} MB/s {:>10.0f} tokens/s".format(
+            name, seconds, size / seconds, len(corpus.form) / seconds))
+
+
+if __name__ == '__main__':
+    main()
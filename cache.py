@@ -0,0 +1,73 @@
+import hashlib
+import os
+import pickle
+
+
+# the phases of ErrorDetector.detect_errors() that leave a snapshot, in the order they are completed
+PHASES = ('corpus', 'nuclei', 'raw')
+
+# a change to one of these files invalidates all snapshots
+SOURCES = ('corpus.py', 'trie.py', 'error_detection.py', 'cache.py')
+
+
+class Cache:
+    """snapshots of the phases of the error detection in binary (pickle) files
+    the snapshots are keyed by a hash of the input files and of the code,
+    the snapshots after the 'corpus' phase additionally by the settings which shape them"""
+
+    def __init__(self, directory: str, filenames: list, settings: dict):
+        self.directory = directory
+        digest = hashlib.sha256()
+        for filename in filenames:
+            # the size separates the files, the same bytes split differently are a different corpus
+            digest.update(str(os.path.getsize(filename)).encode())
+            with open(filename, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        code = os.path.dirname(os.path.abspath(__file__))
+        for source in SOURCES:
+            with open(os.path.join(code, source), 'rb') as f:
+                digest.update(f.read())
+        self.key = digest.hexdigest()[:16]
+        self.settings_key = hashlib.sha256((self.key + repr(sorted(settings.items()))).encode()).hexdigest()[:16]
+
+    def path(self, phase: str) -> str:
+        key = self.key if phase == 'corpus' else self.settings_key
+        return os.path.join(self.directory, '{}.{}.pickle'.format(key, phase))
+
+    def last_phase(self):
+        """returns the last phase with a snapshot, None if there is none
+        the later phases are only usable together with the corpus"""
+        if not os.path.exists(self.path('corpus')):
+            return None
+        for phase in reversed(PHASES):
+            if os.path.exists(self.path(phase)):
+                return phase
+        return None
+
+    def load(self, phase: str):
+        """yields the (name, value) entries of the snapshot in the order they were saved"""
+        return load_entries(self.path(phase))
+
+    def save(self, phase: str, *groups: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        save_entries(self.path(phase), *groups)
+
+
+def load_entries(path: str):
+    """yields the (name, value) entries of a file written by save_entries(),
+    a group of entries is only unpickled when the entries of the previous groups have been processed"""
+    with open(path, 'rb') as f:
+        for _ in range(pickle.load(f)):
+            yield from pickle.load(f).items()
+
+
+def save_entries(path: str, *groups: dict):
+    """writes the groups of entries one by one, the entries of a group are pickled together,
+    so the objects they share (like the items of a trie and of the variation nuclei) are still shared when loaded
+    the file is written to a temporary file first, so an interruption never leaves a broken one"""
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(len(groups), f)
+        for group in groups:
+            pickle.dump(group, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,522 @@
+import bz2
+import glob
+import gzip
+import lzma
+import os
+from itertools import compress
+
+import numpy as np
+
+
+# number of bytes Corpus.read_conllu() reads at once
+READ_SIZE = 1 << 20
+
+# the compressed formats open_treebank() recognizes by the first bytes of a file
+COMPRESSIONS = ((b'\x1f\x8b', gzip.open), (b'\xfd7zXZ\x00', lzma.open), (b'BZh', bz2.open))
+
+# suffix of the sentence index files next to the treebank files (see sentence_index.py), which are no treebanks
+INDEX_SUFFIX = '.sentences.npy'
+
+# number of bytes split_treebank() reads at once while it looks for a sentence boundary
+BOUNDARY_SEARCH_SIZE = 1 << 16
+
+
+class Vocabulary(dict):
+    """implementation of a dictionary interning strings as consecutive integer ids"""
+    def __init__(self):
+        super(Vocabulary, self).__init__()
+        self.strings = list()
+
+    def add(self, string: str) -> int:
+        """returns the id of the string, assigns a new one if it is unknown"""
+        idx = self.get(string)
+        if idx is None:
+            idx = len(self.strings)
+            self[string] = idx
+            self.strings.append(string)
+        return idx
+
+    def clear(self):
+        super(Vocabulary, self).clear()
+        self.strings.clear()
+
+
+class Sentence:
+    """plain python view of a single sentence of the corpus (one list per column)"""
+    __slots__ = ('forms', 'upos', 'heads', 'deprels', '_relations')
+
+    def __init__(self, forms: list, upos: list, heads: list, deprels: list):
+        self.forms = forms
+        self.upos = upos
+        self.heads = heads
+        self.deprels = deprels
+        self._relations = None
+
+    def __len__(self):
+        return len(self.forms)
+
+    def related_forms(self):
+        """returns for every (0-based) token position the word forms of the tokens
+        it is connected to by a dependency (as head or as dependent),
+        split into the related tokens to its right and the related tokens to its left
+        the index is built once per sentence and cached"""
+        if self._relations is None:
+            forms = self.forms
+            right = [set() for _ in forms]
+            left = [set() for _ in forms]
+            for dependent, head_id in enumerate(self.heads):
+                head = head_id - 1
+                if head_id == 0 or head == dependent:
+                    continue
+                if head > dependent:
+                    right[dependent].add(forms[head])
+                    left[head].add(forms[dependent])
+                else:
+                    right[head].add(forms[dependent])
+                    left[dependent].add(forms[head])
+            self._relations = (right, left)
+        return self._relations
+
+
+class Corpus:
+    """columnar store of a treebank in CONLL-U format
+    word forms, UPOS tags and dependency labels are interned, every column is held in one NumPy array
+    and the sentence boundaries are stored as offsets into these arrays"""
+
+    def __init__(self):
+        self.vocab = Vocabulary()
+        self.pos_tags = Vocabulary()
+        self.labels = Vocabulary()
+
+        # the artificial head of the root dependency & the tag which is ignored throughout the analysis
+        self.root = self.vocab.add('root')
+        self.punct = self.pos_tags.add('PUNCT')
+
+        self.form = np.zeros(0, dtype=np.int32)
+        self.upos = np.zeros(0, dtype=np.int16)
+        self.head = np.zeros(0, dtype=np.int32)
+        self.deprel = np.zeros(0, dtype=np.int16)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self._create_views()
+
+        # columns of the sentences that have not been finalized yet,
+        # and arrays of the closed sentences of every block which finalize() appends to the columns at once
+        self._pending = ([], [], [], [])
+        self._pending_offsets = list()
+        self._blocks = list()
+        self._block_tokens = 0
+
+        # the files read into the corpus with the id of their first sentence
+        self.sources = list()
+
+    def __len__(self):
+        return (len(self.offsets) - 1 + sum(len(block[-1]) for block in self._blocks)
+                + len(self._pending_offsets))
+
+    def _token_count(self) -> int:
+        """returns the number of tokens read so far, the ones of the open sentence included"""
+        return len(self.form) + self._block_tokens + len(self._pending[0])
+
+    def add_token(self, form: str, upos: str, head: str, deprel: str):
+        """appends a token to the sentence currently being read"""
+        forms, tags, heads, deprels = self._pending
+        forms.append(self.vocab.add(form))
+        tags.append(self.pos_tags.add(upos))
+        heads.append(int(head))
+        deprels.append(self.labels.add(deprel))
+
+    def read_chunk(self, chunk: tuple):
+        """reads a chunk (filename, start, end) of a treebank file as returned by split_treebank()"""
+        filename, start, end = chunk
+        if not start:
+            self.sources.append((filename, len(self)))
+        with open_treebank(filename) as f:
+            if start:
+                f.seek(start)
+            self.read_conllu(f, None if end is None else end - start)
+
+    def read_conllu(self, f, size: int = None):
+        """reads the sentences of a file in CONLL-U format opened in binary mode and finalizes them
+        only ID (implicitly), FORM, UPOS, HEAD and DEPREL are kept, comments (like any number of '# newdoc' lines),
+        multiword tokens and empty nodes are skipped and every blank line ends a sentence
+        with a size, at most size bytes are read
+        the closed sentences are turned into arrays after every block, only the tokens of the open sentence stay
+        in python lists, and the arrays of all blocks are appended to the columns at the end"""
+        # the columns are interned as byte strings first, so every distinct value is only decoded once
+        interned = (dict(), dict(), dict())
+        for block in iter_blocks(f, size):
+            self._read_lines(block, interned)
+            self._close_block()
+
+        # last sentence in the file, the pending tokens are the ones of the open sentence
+        if self._pending[0]:
+            self.end_sentence()
+        self.finalize()
+
+    def _read_lines(self, block: bytes, interned: tuple):
+        """reads complete lines of a CONLL-U file, the lines are classified by their first byte
+        and the columns of all token lines are split at once"""
+        starts, _, blank, token = classify_lines(block)
+
+        lines = list(compress(block.split(b'\n'), token.tolist()))
+        fields = b'\t'.join(lines).split(b'\t')
+        if len(fields) == 10 * len(lines) and (count_tabs(block, starts)[token] == 9).all():
+            ids, forms, tags, heads, deprels = (fields[0::10], fields[1::10], fields[3::10], fields[6::10],
+                                                fields[7::10])
+        else:
+            # lines with a different number of columns are split one by one
+            rows = [line.split(b'\t', 8) for line in lines]
+            ids, forms, tags, heads, deprels = ([row[k] for row in rows] for k in (0, 1, 3, 6, 7))
+
+        # multiword tokens (1-2) and empty nodes (1.1)
+        joined = b' '.join(ids)
+        if b'-' in joined or b'.' in joined:
+            kept = [b'-' not in i and b'.' not in i for i in ids]
+            forms, tags, heads, deprels = (list(compress(column, kept)) for column in (forms, tags, heads, deprels))
+            token[np.flatnonzero(token)[~np.array(kept, dtype=bool)]] = False
+
+        # every blank line ends a sentence after the tokens before it
+        count = self._token_count()
+        self._pending_offsets.extend((count + np.cumsum(token)[blank]).tolist())
+
+        pending_forms, pending_tags, pending_heads, pending_deprels = self._pending
+        pending_forms.extend(self._intern(forms, interned[0], self.vocab))
+        pending_tags.extend(self._intern(tags, interned[1], self.pos_tags))
+        pending_heads.extend(map(int, heads))
+        pending_deprels.extend(self._intern(deprels, interned[2], self.labels))
+
+    @staticmethod
+    def _intern(values: list, interned: dict, vocabulary: Vocabulary):
+        """maps byte strings to the ids of the vocabulary, new strings are added in the order of their occurrence"""
+        for value in dict.fromkeys(values):
+            if value not in interned:
+                interned[value] = vocabulary.add(value.decode('utf8'))
+        return map(interned.__getitem__, values)
+
+    def end_sentence(self):
+        """closes the sentence currently being read (empty sentences are kept as well)"""
+        self._pending_offsets.append(self._token_count())
+
+    def _close_block(self):
+        """turns the columns of the pending closed sentences into arrays, see finalize()"""
+        if not self._pending_offsets:
+            return
+        forms, tags, heads, deprels = self._pending
+        # tokens after the last closed sentence belong to no sentence yet
+        closed = self._pending_offsets[-1] - len(self.form) - self._block_tokens
+
+        self._blocks.append((np.array(forms[:closed], dtype=np.int32), np.array(tags[:closed], dtype=np.int16),
+                             np.array(heads[:closed], dtype=np.int32), np.array(deprels[:closed], dtype=np.int16),
+                             np.array(self._pending_offsets, dtype=np.int64)))
+        self._block_tokens += closed
+
+        for column in self._pending:
+            del column[:closed]
+        self._pending_offsets.clear()
+
+    def finalize(self):
+        """moves the pending sentences into the NumPy columns
+        the arrays of all blocks are concatenated at once, so reading stays linear in the size of the corpus"""
+        self._close_block()
+        if not self._blocks:
+            return
+        form, upos, head, deprel, offsets = zip(*self._blocks)
+        self.form = np.concatenate((self.form,) + form)
+        self.upos = np.concatenate((self.upos,) + upos)
+        self.head = np.concatenate((self.head,) + head)
+        self.deprel = np.concatenate((self.deprel,) + deprel)
+        self.offsets = np.concatenate((self.offsets,) + offsets)
+        self._blocks.clear()
+        self._block_tokens = 0
+        self._create_views()
+
+    def extend(self, other: 'Corpus'):
+        """appends the sentences of another finalized corpus, its interned ids are mapped to the ones of this corpus
+        (unknown strings are added in the order of the other corpus, as if its sentences had been read here)"""
+        self.finalize()
+        if self._pending[0] or other._pending[0]:
+            raise ValueError("the last sentence of both corpora has to be closed")
+        self.sources.extend((filename, first + len(self)) for filename, first in other.sources)
+        for column, vocabulary, other_vocabulary in (('form', self.vocab, other.vocab),
+                                                     ('upos', self.pos_tags, other.pos_tags),
+                                                     ('deprel', self.labels, other.labels)):
+            values = getattr(self, column)
+            ids = np.array([vocabulary.add(string) for string in other_vocabulary.strings], dtype=values.dtype)
+            setattr(self, column, np.concatenate((values, ids[getattr(other, column)])))
+        self.head = np.concatenate((self.head, other.head))
+        self.offsets = np.concatenate((self.offsets, other.offsets[1:] + self.offsets[-1]))
+        self._create_views()
+
+    def save_columns(self, directory: str):
+        """saves the NumPy columns into files in the directory, see map_columns()"""
+        save_arrays(directory, 'corpus', {column: getattr(self, column) for column in COLUMNS})
+
+    def map_columns(self, directory: str):
+        """replaces the columns by read-only memory maps of the files save_columns() wrote into the directory"""
+        self.__dict__.update(map_arrays(directory, 'corpus', COLUMNS))
+        self._create_views()
+
+    def _create_views(self):
+        """memoryviews on the columns allow fast scalar access returning plain python ints"""
+        self.form_view = memoryview(self.form)
+        self.upos_view = memoryview(self.upos)
+        self.head_view = memoryview(self.head)
+        self.deprel_view = memoryview(self.deprel)
+        self.offsets_view = memoryview(self.offsets)
+
+    def __getstate__(self):
+        # memoryviews cannot be pickled, they are recreated after loading
+        state = self.__dict__.copy()
+        for view in ('form_view', 'upos_view', 'head_view', 'deprel_view', 'offsets_view'):
+            del state[view]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_views()
+
+    def clear(self):
+        self.__init__()
+
+    def index(self, sentence_id: int, position: int) -> int:
+        """returns the index of the (0-based) token position into the columns
+        negative positions count from the end of the sentence, just like list indices do"""
+        if position < 0:
+            return self.offsets_view[sentence_id + 1] + position
+        return self.offsets_view[sentence_id] + position
+
+    def sentence(self, sentence_id: int) -> Sentence:
+        """returns the columns of a sentence as plain python lists"""
+        start, end = self.offsets_view[sentence_id], self.offsets_view[sentence_id + 1]
+        return Sentence(self.form_view[start:end].tolist(), self.upos_view[start:end].tolist(),
+                        self.head_view[start:end].tolist(), self.deprel_view[start:end].tolist())
+
+    def word(self, sentence_id: int, word_id: int) -> str:
+        """returns the word form of the token with the given (1-based) id"""
+        return self.vocab.strings[self.form_view[self.index(sentence_id, word_id - 1)]]
+
+
+# the NumPy arrays of Corpus and Neighbours which save_arrays() stores for other processes
+COLUMNS = ('form', 'upos', 'head', 'deprel', 'offsets')
+NEIGHBOURS_ARRAYS = ('offsets', 'before', 'after', 'next', 'previous', 'count', 'powers', 'prefix')
+
+# odd 64-bit base of the polynomial hashes of Neighbours, arithmetic is modulo 2 ** 64
+HASH_BASE = 0x9E3779B97F4A7C15
+
+
+class Neighbours:
+    """precomputed surroundings and hashes of the tokens of a corpus for the context heuristics
+    the surroundings follow the rules of ErrorDetector.get_surrounding(): a punctuation token is skipped once
+    and positions before the start of a sentence count from its end
+    the internal context of an item is hashed by prefix sums over the non-punctuation tokens of the corpus,
+    equal contexts have equal hashes (but equal hashes have to be confirmed)
+    the functions except surrounding() take NumPy arrays of locations (sentence, word1, word2)
+    and return one value per location"""
+
+    def __init__(self, corpus: Corpus):
+        # the surroundings keep the int32 ids of the corpus, only the hashes are computed in uint64
+        form = corpus.form
+        punct = corpus.upos == corpus.punct
+        n = len(form)
+        lengths = np.diff(corpus.offsets)
+        sentence = np.repeat(np.arange(len(lengths)), lengths)
+        start = corpus.offsets[sentence]
+        end = corpus.offsets[sentence + 1]
+        positions = np.arange(n)
+        self.offsets = corpus.offsets
+
+        # one more token at the end, so the lookups after the last token of the corpus find no context
+        def padded(values):
+            result = np.full(n + 1, -1, dtype=np.int32)
+            result[:n] = values
+            return result
+
+        kept = np.where(punct, -1, form)
+        previous = np.where(positions > start, np.roll(kept, 1), -1)
+        following = np.where(positions + 1 < end, np.roll(kept, -1), -1)
+        # the word before word1 and after word2, -1 if the neighbour of a punctuation token is one as well
+        self.before = padded(np.where(punct, previous, form))
+        self.after = padded(np.where(punct, following, form))
+        # the word after word1 and before word2, -1 after the end of the sentence, before its start these wrap around
+        self.next = padded(np.where(punct, np.where(positions + 1 < end, np.append(form[1:], np.int32(-1)), -1), form))
+        self.previous = padded(np.where(punct, form[np.where(positions > start, positions - 1, end - 1)], form))
+
+        # count[i] is the number of non-punctuation tokens before i, the hash of tokens[a:b] is
+        # (prefix[b] - prefix[a]) * HASH_BASE ** count[b], which does not depend on the position of the tokens
+        self.count = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(~punct, out=self.count[1:])
+        self.powers = np.ones(self.count[-1] + 1, dtype=np.uint64)
+        np.cumprod(np.full(self.count[-1], HASH_BASE, dtype=np.uint64), out=self.powers[1:])
+        inverse = np.ones(self.count[-1] + 1, dtype=np.uint64)
+        np.cumprod(np.full(self.count[-1], pow(HASH_BASE, -1, 1 << 64), dtype=np.uint64), out=inverse[1:])
+        weights = np.where(punct, np.uint64(0), (form + 1).astype(np.uint64) * inverse[self.count[1:]])
+        self.prefix = np.zeros(n + 1, dtype=np.uint64)
+        np.cumsum(weights, out=self.prefix[1:])
+        self._create_views()
+
+    def _create_views(self):
+        # for the lookups of single locations
+        self.offsets_view = memoryview(self.offsets)
+        self.before_view, self.after_view = memoryview(self.before), memoryview(self.after)
+        self.next_view, self.previous_view = memoryview(self.next), memoryview(self.previous)
+
+    def save(self, directory: str):
+        """saves the arrays into files in the directory, see load()"""
+        save_arrays(directory, 'neighbours', {name: getattr(self, name) for name in NEIGHBOURS_ARRAYS})
+
+    @classmethod
+    def load(cls, directory: str) -> 'Neighbours':
+        """returns the neighbours which save() wrote into the directory, their arrays are read-only memory maps"""
+        neighbours = cls.__new__(cls)
+        neighbours.__dict__.update(map_arrays(directory, 'neighbours', NEIGHBOURS_ARRAYS))
+        neighbours._create_views()
+        return neighbours
+
+    def surrounding(self, sentence: int, word1: int, word2: int) -> list:
+        """returns the four surrounding words of a single location"""
+        offset, end = self.offsets_view[sentence], self.offsets_view[sentence + 1]
+        return [self.before_view[offset + word1 - 2] if word1 > 1 else -1,
+                self.next_view[offset + word1],
+                self.previous_view[offset + word2 - 2 if word2 > 1 else end - 1],
+                self.after_view[offset + word2] if offset + word2 < end else -1]
+
+    def index(self, sentence: np.ndarray, position: np.ndarray) -> np.ndarray:
+        """vectorized Corpus.index()"""
+        return np.where(position < 0, self.offsets[sentence + 1], self.offsets[sentence]) + position
+
+    def surroundings(self, sentence: np.ndarray, word1: np.ndarray, word2: np.ndarray) -> np.ndarray:
+        """returns the four surrounding words of ErrorDetector.get_surrounding() as the columns of an array"""
+        offset = self.offsets[sentence]
+        length = self.offsets[sentence + 1] - offset
+        return np.stack((np.where(word1 > 1, self.before[offset + np.maximum(word1 - 2, 0)], -1),
+                         self.next[offset + word1],
+                         self.previous[self.index(sentence, np.where(word2 > 1, word2 - 2, -1))],
+                         np.where(word2 < length, self.after[offset + np.minimum(word2, length)], -1)), axis=1)
+
+    def internal_hashes(self, sentence: np.ndarray, word1: np.ndarray, word2: np.ndarray) -> tuple:
+        """returns the number of non-punctuation tokens between word1 and word2 and their hash"""
+        offset = self.offsets[sentence]
+        start, end = offset + word1, offset + word2 - 1
+        count = self.count[end] - self.count[start]
+        return count, (self.prefix[end] - self.prefix[start]) * self.powers[self.count[end]]
+
+
+def save_arrays(directory: str, prefix: str, arrays: dict):
+    """saves NumPy arrays into files named <prefix>-<name>.npy in the directory"""
+    for name, values in arrays.items():
+        np.save(os.path.join(directory, '{}-{}.npy'.format(prefix, name)), values)
+
+
+def map_arrays(directory: str, prefix: str, names: tuple) -> dict:
+    """returns the arrays save_arrays() wrote into the directory as read-only memory maps by their names,
+    the processes mapping the same files share their pages"""
+    return {name: np.load(os.path.join(directory, '{}-{}.npy'.format(prefix, name)), mmap_mode='r') for name in names}
+
+
+def iter_blocks(f, size: int = None):
+    """yields blocks of about READ_SIZE bytes of complete lines of a file opened in binary mode (at most size bytes),
+    a last line without a line break gets one"""
+    rest = b''
+    while True:
+        block = f.read(READ_SIZE if size is None else min(READ_SIZE, size))
+        if size is not None:
+            size -= len(block)
+        if not block:
+            if rest:
+                yield rest + b'\n'
+            return
+        # the lines after the last line break are completed by the next block
+        block = rest + block
+        end = block.rfind(b'\n') + 1
+        if end:
+            yield block[:end]
+        rest = block[end:]
+
+
+def classify_lines(block: bytes) -> tuple:
+    """returns the starts and ends (the positions of the line breaks) of the lines of a block of complete lines
+    and which of them are blank and which are token lines (neither blank nor comments)"""
+    buffer = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(buffer == 10)
+    starts = np.zeros_like(ends)
+    starts[1:] = ends[:-1] + 1
+    first = buffer[starts]
+    blank = (first == 10) | ((first == 13) & (ends - starts == 1))
+    token = ~blank & (first != 35)  # '#'
+    return starts, ends, blank, token
+
+
+def count_tabs(block: bytes, starts: np.ndarray) -> np.ndarray:
+    """returns the number of tabs of every line of a block of complete lines, given the starts of the lines"""
+    return np.add.reduceat(np.frombuffer(block, dtype=np.uint8) == 9, starts, dtype=np.int64)
+
+
+def get_opener(filename: str):
+    """returns the function which opens the file, open() unless the first bytes show a compressed format"""
+    with open(filename, 'rb') as f:
+        magic = f.read(6)
+    for prefix, opener in COMPRESSIONS:
+        if magic.startswith(prefix):
+            return opener
+    return open
+
+
+def open_treebank(filename: str):
+    """opens a treebank file for reading in binary mode, decompresses gzip, xz and bzip2 files on the fly"""
+    return get_opener(filename)(filename, 'rb')
+
+
+def find_treebanks(source) -> list:
+    """returns the treebank files of a source in reading order
+    a source is a file, a directory (all its files, sorted by name), a glob pattern (all matches, sorted by name)
+    or a list of sources"""
+    if isinstance(source, (list, tuple)):
+        return [filename for part in source for filename in find_treebanks(part)]
+    if os.path.isdir(source):
+        filenames = (os.path.join(source, name) for name in sorted(os.listdir(source))
+                     if not name.startswith('.') and not name.endswith(INDEX_SUFFIX))
+        return [filename for filename in filenames if os.path.isfile(filename)]
+    if os.path.exists(source):
+        return [source]
+    filenames = sorted(filename for filename in glob.glob(source)
+                       if os.path.isfile(filename) and not filename.endswith(INDEX_SUFFIX))
+    if not filenames:
+        raise FileNotFoundError("no treebank found at {}".format(source))
+    return filenames
+
+
+def split_treebank(filename: str, chunk_size: int) -> list:
+    """returns the chunks of a treebank file as (filename, start, end) byte ranges of about chunk_size bytes,
+    every chunk but the first begins after a blank line, the end of the last one is None
+    compressed files cannot be split and form a single chunk"""
+    size = os.path.getsize(filename)
+    if size <= chunk_size or get_opener(filename) is not open:
+        return [(filename, 0, None)]
+    chunks = list()
+    start = 0
+    with open(filename, 'rb') as f:
+        while size - start > chunk_size:
+            end = find_sentence_boundary(f, start + chunk_size)
+            if end is None or end >= size:
+                break
+            chunks.append((filename, start, end))
+            start = end
+    chunks.append((filename, start, None))
+    return chunks
+
+
+def find_sentence_boundary(f, position: int):
+    """returns the position after the first blank line that ends at or after position (None if there is none)"""
+    f.seek(position)
+    tail = b''
+    while True:
+        block = f.read(BOUNDARY_SEARCH_SIZE)
+        if not block:
+            return None
+        data = tail + block
+        ends = [i + len(blank) for blank in (b'\n\n', b'\n\r\n') for i in (data.find(blank),) if i >= 0]
+        if ends:
+            return position - len(tail) + min(ends)
+        # a blank line may begin at the end of the block
+        position += len(block)
+        tail = data[-2:]
@@ -1,7 +1,18 @@
-import progressbar
 import json
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from itertools import chain, islice
 
-from trie import Trie, Item
+import numpy as np
+
+from cache import Cache, load_entries, save_entries
+from corpus import Corpus, Neighbours, Sentence, find_treebanks, map_arrays, save_arrays, split_treebank
+from metrics import Metrics, Progress, emit_json
+from output import JsonLinesWriter, BinaryWriter
+from suffix_array import ContextIndex
+from trie import Trie, NilTrie, Item, VariationNuclei, LABELS
 
 
 # control the applied heuristics by setting these constants
@@ -12,339 +23,1206 @@ APPLY_POS_HEURISTIC = True
 POS_FILTER = 'PRON'
 NO_REPETITION = False
 
+# control the processing strategy by setting these constants
+# only collect the NIL items for word pairs that also occur as a genuine dependency (same output, less memory)
+DEMAND_DRIVEN_NIL = False
+# number of processes used by read_data(), analyze_sentences() and apply_heuristics(), the sentences are split into
+# SHARDS_PER_WORKER shards per process
+NUM_WORKERS = 1
+SHARDS_PER_WORKER = 4
+# uncompressed treebank files are split into chunks of about this many bytes, which read_data() parses in parallel
+READ_CHUNK_SIZE = 1 << 26
+# filter the raw variation nuclei while they are produced instead of collecting all of them first
+STREAMING = False
+# only pair the items whose heuristic keys (context, function, pos tags) match instead of rejecting every other pair
+HASH_JOIN = False
+# number of raw variation nuclei the heuristics are applied to at once (as NumPy arrays)
+HEURISTICS_BATCH_SIZE = 1 << 14
+
+# control the output by setting these constants
+OUTPUT_FILE = "data/variationNuclei.json"
+# 'json' saves the accepted variation nuclei at the end, 'jsonl' (one per line) and 'binary' (integer records)
+# write them while they are accepted
+OUTPUT_FORMAT = 'json'
+# save one record per word pair (label histogram and instances per label) instead of every variation nucleus,
+# only for the json output
+GROUPED_OUTPUT = False
+# save the lengths of the longest left and right contexts shared by the instances of a variation nucleus
+# (or of all instances of a word pair with GROUPED_OUTPUT), only for the json output
+EXTEND_CONTEXTS = False
+# with EXTEND_CONTEXTS, save the variation nuclei (or word pairs) with the longest shared contexts first
+SORT_BY_CONTEXT = False
+
+# keep snapshots of the phases on disk, a run resumes after the last phase whose input, code and settings are unchanged
+USE_CACHE = False
+CACHE_DIR = "cache"
+
+# control the progress reports and the metrics by setting these constants
+# 'bar' shows progress bars, 'json' writes the progress and the metrics of every phase as json lines to stderr,
+# 'none' reports nothing; a callback set as ErrorDetector.progress_callback replaces the bars and json lines
+PROGRESS = 'bar'
+# minimum number of seconds between two progress reports of a loop
+PROGRESS_INTERVAL = 0.5
+# also trace the python allocations of every phase with tracemalloc (much slower)
+TRACE_MEMORY = False
+# save the metrics of a run (time and memory per phase, counts) as json into this file, None to not save them
+METRICS_FILE = None
+
+# bits of the heuristics evaluated by ErrorDetector.sweep(), the pos heuristic takes one bit per POS filter
+NON_FRINGE_BIT = 1
+NIL_INTERNAL_CONTEXT_BIT = 2
+DEPENDENCY_CONTEXT_BIT = 4
+POS_BIT = 8
+
+# the heuristics in the order they are applied, the keys of ErrorDetector.rejections
+HEURISTICS = ('non_fringe', 'nil_internal_context', 'dependency_context', 'pos', 'no_repetition')
+
+# the columns of an item in the arrays of raw variation nuclei, see ErrorDetector.get_columns()
+ITEM_COLUMNS = 6
+# the arrays of ErrorDetector.get_raw_columns() which the worker processes of the heuristics map
+RAW_ARRAYS = ('items', 'first', 'second')
+
+
+class Configuration:
+    """runtime settings of the heuristics, the settings which are not given are taken from the constants above"""
+
+    def __init__(self, name: str = 'default', non_fringe: bool = None, nil_internal_context: bool = None,
+                 dependency_context: bool = None, pos: bool = None, pos_filter: str = None,
+                 no_repetition: bool = None):
+        self.name = name
+        self.non_fringe = APPLY_NON_FRINGE_HEURISTIC if non_fringe is None else non_fringe
+        self.nil_internal_context = (APPLY_NIL_INTERNAL_CONTEXT_HEURISTIC if nil_internal_context is None
+                                     else nil_internal_context)
+        self.dependency_context = (APPLY_DEPENDENCY_CONTEXT_HEURISTIC if dependency_context is None
+                                   else dependency_context)
+        self.pos = APPLY_POS_HEURISTIC if pos is None else pos
+        self.pos_filter = POS_FILTER if pos_filter is None else pos_filter
+        self.no_repetition = NO_REPETITION if no_repetition is None else no_repetition
+
+    def get_settings(self) -> dict:
+        """returns the settings of the heuristics (without the name)"""
+        return {'non_fringe': self.non_fringe, 'nil_internal_context': self.nil_internal_context,
+                'dependency_context': self.dependency_context, 'pos': self.pos, 'pos_filter': self.pos_filter,
+                'no_repetition': self.no_repetition}
+
 
 class ErrorDetector:
     """this class provides an error detection for the TuebaDZ Treebank
     the functions strongly depend on each other; detect_errors() connects the whole process"""
 
-    def __init__(self):
-        self.sentences = list()
+    def __init__(self, config: Configuration = None):
+        self.config = config if config is not None else Configuration()
+        self.corpus = Corpus()
         self.nuclei = Trie()
         self.nuclei_count = 0
-        self.variation_nuclei_raw = list()
+        self.raw_count = 0
+        self.variation_nuclei_raw = VariationNuclei()
         self.variation_nuclei = list()
-        self.nil = Trie()
+        self.nil = NilTrie()
+
+        # items of the accepted variation nuclei (for NO_REPETITION)
+        self.used_items = set()
+
+        # writes the accepted variation nuclei (for the streaming output formats)
+        self.writer = None
+
+        # suffix arrays of the corpus for EXTEND_CONTEXTS and surroundings for the heuristics, built on first use
+        self.context_index = None
+        self.neighbours = None
+
+        # the measurements of the last run, the number of raw variation nuclei rejected per heuristic
+        # and a function (phase, value, max_value) called with the progress of the loops
+        self.metrics = Metrics()
+        self.rejections = dict.fromkeys(HEURISTICS, 0)
+        self.progress_callback = None
+
+        # interned labels of the dependency pairs per dependency relation of the corpus
+        self.label_ids = list()
+        self.root_label = None
 
     def analyze_nil(self):
         """
         iterates through all the nuclei previously collected in analyze_sentences()
         and searches for variation nuclei among the NIL items
         """
-        with progressbar.ProgressBar(max_value=self.nuclei_count) as bar:
-            count = 0
-            for word1, level2 in self.nuclei.items():
-                for word2, items in level2.items():
-                    nil_items = self.nil.find_pairs(word1, word2)
-
-                    for item in items:
-                        if len(item.label) > 1:
-                            # skip items with overlaps
-                            continue
-                        for nil_item in nil_items:
-                            self.variation_nuclei_raw.append((item, nil_item))
-
-                        count += 1
+        raw = self.variation_nuclei_raw
+        with self.progress('analyze_nil', self.nuclei_count) as bar:
+            for item, nil_items in self.iter_nil_products(bar):
+                raw.add_product(item, nil_items)
+
+    def iter_nil_variation_nuclei(self, bar=None):
+        """generator version of analyze_nil(), yields the raw variation nuclei one by one"""
+        for item, nil_items in self.iter_nil_products(bar):
+            for nil_item in nil_items:
+                yield item, nil_item
+
+    def iter_nil_products(self, bar=None):
+        """yields every labelled item together with the NIL items it forms raw variation nuclei with
+        (the NIL items of its word pair) and counts them"""
+        if HASH_JOIN:
+            yield from self.iter_joined_nil_products(bar)
+            return
+
+        count = 0
+        for word1, level2 in self.nuclei.items():
+            for word2, items in level2.items():
+                nil_items = self.nil.find_pairs(word1, word2)
+
+                for item in items:
+                    if item.has_overlap():
+                        # skip items with overlaps
+                        continue
+                    if nil_items:
+                        self.raw_count += len(nil_items)
+                        yield item, nil_items
+
+                    count += 1
+                    if bar:
+                        bar.update(count)
+
+    def iter_joined_nil_products(self, bar=None):
+        """
+        hash join version of iter_nil_products()
+        the NIL items of a word pair are bucketed by their join key, so every labelled item is only paired with
+        the NIL items that pass the heuristics; raw_count still counts the full cross product
+        """
+        count = 0
+        for word1, level2 in self.nuclei.items():
+            for word2, items in level2.items():
+                nil_items = self.nil.find_pairs(word1, word2)
+
+                # one index per direction of the labelled items, built on first use
+                indexes = dict()
+                for item in items:
+                    if item.has_overlap():
+                        # skip items with overlaps
+                        continue
+                    self.raw_count += len(nil_items)
+
+                    if nil_items:
+                        left = item.head() == item.word1
+                        index = indexes.get(left)
+                        if index is None:
+                            index = indexes[left] = dict()
+                            for nil_item in nil_items:
+                                key = self.get_join_key(nil_item, True, nil_item.word1 if left else nil_item.word2)
+                                if key is not None:
+                                    index.setdefault(key, []).append(nil_item)
+
+                        key = self.get_join_key(item, True, item.head())
+                        if key in index:
+                            yield item, index[key]
+
+                    count += 1
+                    if bar:
                         bar.update(count)
 
+    def get_dependency_join_key(self, item: Item):
+        """join key of a labelled item for the variation nuclei among the dependency pairs
+        the dependency context heuristic depends on the final labels and is not part of it"""
+        return self.get_join_key(item, False)
+
     def analyze_sentences(self):
         """
         main loop for first iteration
         calls other functions to retrieve nuclei, searches for variation nuclei and collects the NIL items
         """
 
+        self.intern_labels()
+        if NUM_WORKERS > 1:
+            self.analyze_shards(NUM_WORKERS)
+            return
+
+        demand_driven = DEMAND_DRIVEN_NIL
+
+        # with the hash join, the variation nuclei are detected on the complete trie
+        self.nuclei.detect = not HASH_JOIN
+
         # init progressbar
-        with progressbar.ProgressBar(max_value=len(self.sentences)) as bar:
-            for i in range(len(self.sentences)):
+        with self.progress('analyze_sentences', len(self.corpus)) as bar:
+            self.analyze_sentence_range(0, len(self.corpus), not demand_driven, bar)
+
+        if HASH_JOIN:
+            self.nuclei.detect = True
+            self.add_raw_variation_nuclei(*self.nuclei.detect_variation_nuclei(self.get_dependency_join_key))
+
+        if demand_driven:
+            with self.progress('collect_demanded_nil_items', len(self.corpus)) as bar:
+                self.collect_demanded_nil_items(0, len(self.corpus), self.nuclei, bar)
+
+    def intern_labels(self):
+        """interns the directed labels of all dependency relations of the corpus, in the same order in every process"""
+        self.label_ids = [(LABELS.add(label + '-L'), LABELS.add(label + '-R')) for label in self.corpus.labels.strings]
+        self.root_label = LABELS.add('root-L')
+
+    def analyze_sentence_range(self, start: int, end: int, collect_nil: bool = True, bar=None):
+        """collects the nuclei (and NIL items) of the sentences start to end - 1"""
+
+        punct = self.corpus.punct
+        for i in range(start, end):
+            if bar:
                 bar.update(i)
-                sentence = self.sentences[i]
+            sentence = self.corpus.sentence(i)
 
-                # go through each word in the sentence
-                for item in sentence:
-                    if item[3] == 'PUNCT':
-                        continue
-                    self.collect_dependency_pair(sentence, item, i)
-                    self.nuclei_count += 1
-                    self.collect_nil_items(sentence, item, i)
+            # go through each word in the sentence
+            for word_id in range(1, len(sentence) + 1):
+                if sentence.upos[word_id - 1] == punct:
+                    continue
+                self.collect_dependency_pair(sentence, word_id, i)
+                self.nuclei_count += 1
+                if collect_nil:
+                    self.collect_nil_items(sentence, word_id, i)
 
-    def apply_heuristics(self):
-        """wrapper method for the other heuristics methods"""
+    def collect_demanded_nil_items(self, start: int, end: int, nuclei: dict, bar=None):
+        """
+        second iteration for the demand-driven mode, requires the complete nuclei trie (or its word pairs)
+        collects only the NIL items whose word pair also occurs as a nucleus, since analyze_nil() ignores all others
+        """
 
-        # init progressbar
-        with progressbar.ProgressBar(max_value=len(self.variation_nuclei_raw)) as bar:
-            for i in range(len(self.variation_nuclei_raw)):
+        punct = self.corpus.punct
+        for i in range(start, end):
+            if bar:
                 bar.update(i)
+            sentence = self.corpus.sentence(i)
 
-                item1, item2 = self.variation_nuclei_raw[i]
-                accept = True
-                if item2.label:
-                    if APPLY_NON_FRINGE_HEURISTIC:
-                        accept = self.apply_non_fringe_heuristic(item1, item2)
-                else:
-                    if APPLY_NIL_INTERNAL_CONTEXT_HEURISTIC:
-                        accept = self.apply_nil_internal_context_heuristics(item1, item2)
+            for word_id in range(1, len(sentence) + 1):
+                if sentence.upos[word_id - 1] == punct:
+                    continue
 
-                if APPLY_DEPENDENCY_CONTEXT_HEURISTIC and accept:
-                    accept = self.apply_dependency_context_heuristic(item1, item2)
+                # the known dependency pairs starting with this word
+                demanded = nuclei.get(sentence.forms[word_id - 1])
+                if demanded:
+                    self.collect_nil_items(sentence, word_id, i, demanded)
 
-                if APPLY_POS_HEURISTIC and accept:
-                    accept = self.apply_pos_heuristic(item1, item2)
+    def analyze_shards(self, workers: int):
+        """
+        parallel version of analyze_sentences()
+        the sentences are split into consecutive shards which are analyzed by a pool of processes,
+        the partial tries are sent back as compact arrays (see Trie.to_columns()) and merged in sentence order,
+        the variation nuclei are detected on the merged trie
+        the results are identical to the ones of a single process
+        """
 
-                if NO_REPETITION and accept:
-                    accept = self.eliminate_duplicates(item1, item2)
+        size = -(-len(self.corpus) // (workers * SHARDS_PER_WORKER)) or 1
+        shards = [(start, min(start + size, len(self.corpus))) for start in range(0, len(self.corpus), size)]
+        demand_driven = DEMAND_DRIVEN_NIL
+
+        with multiprocessing.Pool(workers, _init_worker, (self.corpus, LABELS.strings)) as pool:
+            with self.progress('analyze_shards', len(shards)) as bar:
+                for i, (nuclei, nil, count) in enumerate(pool.imap(_analyze_shard, [
+                        (start, end, not demand_driven) for start, end in shards])):
+                    self.nuclei.add_columns(*nuclei)
+                    self.nil.add_columns(*nil)
+                    self.nuclei_count += count
+                    bar.update(i + 1)
+
+            key = self.get_dependency_join_key if HASH_JOIN else None
+            self.add_raw_variation_nuclei(*self.nuclei.detect_variation_nuclei(key))
+
+            if demand_driven:
+                # the workers only need the word pairs of the nuclei
+                pairs = {word1: set(level2) for word1, level2 in self.nuclei.items()}
+                with self.progress('collect_demanded_shards', len(shards)) as bar:
+                    for i, nil in enumerate(pool.imap(_collect_demanded_shard, [
+                            (start, end, pairs) for start, end in shards])):
+                        self.nil.add_columns(*nil)
+                        bar.update(i + 1)
+
+    def apply_heuristics(self, variation_nuclei=None):
+        """wrapper method for the other heuristics methods
+        filters the raw variation nuclei, or the given iterable of variation nuclei (without progress reports)
+        the heuristics are applied to batches of HEURISTICS_BATCH_SIZE variation nuclei at once"""
+
+        if variation_nuclei is not None:
+            variation_nuclei = iter(variation_nuclei)
+            batches = iter(lambda: list(islice(variation_nuclei, HEURISTICS_BATCH_SIZE)), [])
+            for batch, accepted in self.iter_checked_batches(batches, NUM_WORKERS > 1):
+                self.add_batch(batch, accepted)
+            return
 
-                if accept:
-                    self.variation_nuclei.append((item1, item2))
+        raw = self.variation_nuclei_raw
+        with self.progress('apply_heuristics', len(raw)) as bar:
+            ranges = ((start, min(start + HEURISTICS_BATCH_SIZE, len(raw)))
+                      for start in range(0, len(raw), HEURISTICS_BATCH_SIZE))
+            parallel = NUM_WORKERS > 1 and len(raw) > HEURISTICS_BATCH_SIZE
+            for (start, end), accepted in self.iter_checked_batches(ranges, parallel, raw):
+                bar.update(start)
+                self.add_batch(raw[start:end], accepted)
+
+    def iter_checked_batches(self, batches, parallel: bool = False, raw: VariationNuclei = None):
+        """
+        yields every batch of raw variation nuclei together with check_batch() of it, in the order of the batches
+        with raw, the batches are (start, end) ranges of raw, whose columns are built only once (see get_raw_columns())
+        in parallel, a pool of NUM_WORKERS processes checks the batches: the corpus, its neighbours and the columns
+        of raw are saved into a temporary directory once and every process maps these files, only the columns
+        of the batches (or their ranges) are sent to the processes, at most two batches per process are checked
+        at a time
+        """
+        if raw is not None:
+            columns = self.get_raw_columns(raw)
+        if not parallel:
+            for batch in batches:
+                if raw is None:
+                    yield batch, self.check_batch(batch)
+                else:
+                    yield batch, self.check_columns(self.get_range_columns(*columns, *batch))
+            return
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.corpus.save_columns(directory)
+            self.get_neighbours().save(directory)
+            if raw is not None:
+                save_arrays(directory, 'raw', dict(zip(RAW_ARRAYS, columns)))
+            with multiprocessing.Pool(NUM_WORKERS, _init_heuristics_worker, (
+                    directory, self.corpus.pos_tags, self.corpus.punct, self.config, raw is not None)) as pool:
+                pending = deque()
+                for batch in batches:
+                    if raw is None:
+                        result = pool.apply_async(_check_columns, (self.get_columns(batch),))
+                    else:
+                        result = pool.apply_async(_check_range, batch)
+                    pending.append((batch, result))
+                    if len(pending) == 2 * NUM_WORKERS:
+                        yield self.get_checked_batch(*pending.popleft())
+                while pending:
+                    yield self.get_checked_batch(*pending.popleft())
+
+    def get_checked_batch(self, batch: list, result) -> tuple:
+        """waits for the result of a worker process, adds up its rejections and returns the batch with the result"""
+        accepted, rejections = result.get()
+        for name, count in rejections.items():
+            self.rejections[name] += count
+        return batch, accepted
+
+    def add_batch(self, batch: list, accepted: np.ndarray = None):
+        """stores the variation nuclei of the batch which are accepted by the heuristics (by default check_batch())
+        NO_REPETITION depends on the variation nuclei accepted before, it is applied one by one"""
+        if accepted is None:
+            accepted = self.check_batch(batch)
+        no_repetition = self.config.no_repetition
+        for i in np.flatnonzero(accepted).tolist():
+            item1, item2 = batch[i]
+            if no_repetition and not self.eliminate_duplicates(item1, item2):
+                self.rejections['no_repetition'] += 1
+                continue
+            self.add_variation_nucleus(item1, item2)
+
+    def check_batch(self, batch: list) -> np.ndarray:
+        """applies the heuristics (without NO_REPETITION, see add_batch()) to a batch of raw variation nuclei at once,
+        returns whether each variation nucleus of the batch is accepted"""
+        return self.check_columns(self.get_columns(batch))
+
+    def check_columns(self, columns: np.ndarray) -> np.ndarray:
+        """check_batch() of the columns of a batch (see get_columns()),
+        every heuristic is only evaluated for the variation nuclei the others before accepted"""
+        config = self.config
+        checks = list()
+        if config.non_fringe:
+            checks.append(('non_fringe', self.non_fringe_mask))
+        if config.nil_internal_context:
+            checks.append(('nil_internal_context', self.nil_internal_context_mask))
+        if config.dependency_context:
+            checks.append(('dependency_context', self.dependency_context_mask))
+        if config.pos:
+            checks.append(('pos', self.pos_mask))
+
+        accepted = np.ones(len(columns), dtype=bool)
+        for name, mask in checks:
+            rows = np.flatnonzero(accepted)
+            if not len(rows):
+                break
+            passed = mask(columns[rows])
+            self.rejections[name] += len(rows) - int(np.count_nonzero(passed))
+            accepted[rows[~passed]] = False
+        return accepted
+
+    @staticmethod
+    def get_columns(batch: list) -> np.ndarray:
+        """returns an array with a row per raw variation nucleus holding the sentence, word1, word2, head (-1 for NIL)
+        and whether it has an overlap and whether it is NIL for both items
+        the items recur in many variation nuclei, every distinct item of the batch is only read once"""
+        variation_nuclei = VariationNuclei()
+        variation_nuclei.extend(batch)
+        return ErrorDetector.get_range_columns(*ErrorDetector.get_raw_columns(variation_nuclei))
+
+    @staticmethod
+    def get_raw_columns(raw: VariationNuclei) -> tuple:
+        """returns the columns of every distinct item of the raw variation nuclei (see get_columns())
+        and the rows of the first and of the second item of every raw variation nucleus"""
+        columns = np.fromiter(chain.from_iterable(
+            (item.sentence, item.word1, item.word2, -1 if item.is_nil() else item.head(), item.has_overlap(),
+             item.is_nil()) for item in raw.items), dtype=np.int64, count=ITEM_COLUMNS * len(raw.items))
+        first = np.frombuffer(raw.first, dtype=np.int32).copy()
+        second = np.frombuffer(raw.second, dtype=np.int32).copy()
+        return columns.reshape(-1, ITEM_COLUMNS), first, second
+
+    @staticmethod
+    def get_range_columns(items: np.ndarray, first: np.ndarray, second: np.ndarray, start: int = 0, end: int = None):
+        """get_columns() of the raw variation nuclei start to end - 1 from the arrays of get_raw_columns()"""
+        return np.hstack((items[first[start:end]], items[second[start:end]]))
+
+    def get_neighbours(self) -> Neighbours:
+        if self.neighbours is None:
+            self.neighbours = Neighbours(self.corpus)
+        return self.neighbours
+
+    def non_fringe_mask(self, columns: np.ndarray) -> np.ndarray:
+        """vectorized apply_non_fringe_heuristic(), the pairs with a NIL item pass"""
+        sentence1, word1_1, word2_1, _, _, _, sentence2, word1_2, word2_2, _, _, nil = columns.T
+        passed = nil.astype(bool)
+        rows = np.flatnonzero(~passed)
+        neighbours = self.get_neighbours()
+        passed[rows] = (neighbours.surroundings(sentence1[rows], word1_1[rows], word2_1[rows]) ==
+                        neighbours.surroundings(sentence2[rows], word1_2[rows], word2_2[rows])).all(axis=1)
+        return passed
+
+    def nil_internal_context_mask(self, columns: np.ndarray) -> np.ndarray:
+        """vectorized apply_nil_internal_context_heuristics(), the pairs without a NIL item pass
+        the internal contexts are compared by their hashes, the ones with equal hashes are compared once more"""
+        sentence1, word1_1, word2_1, _, _, _, sentence2, word1_2, word2_2, _, _, nil = columns.T
+        passed = ~nil.astype(bool)
+        rows = np.flatnonzero(nil)
+        neighbours = self.get_neighbours()
+        count1, hash1 = neighbours.internal_hashes(sentence1[rows], word1_1[rows], word2_1[rows])
+        count2, hash2 = neighbours.internal_hashes(sentence2[rows], word1_2[rows], word2_2[rows])
+        for i in rows[(count1 > 0) & (count1 == count2) & (hash1 == hash2)].tolist():
+            passed[i] = (self.internal_context(sentence1[i], word1_1[i], word2_1[i]) ==
+                         self.internal_context(sentence2[i], word1_2[i], word2_2[i]))
+        return passed
+
+    def dependency_context_mask(self, columns: np.ndarray) -> np.ndarray:
+        """vectorized apply_dependency_context_heuristic()"""
+        sentence1, word1_1, _, head1, overlap, _, sentence2, word1_2, word2_2, head2, _, _ = columns.T
+        other = np.where(overlap == 1, head2, np.where(head1 == word1_1, word1_2, word2_2))
+        neighbours, deprel = self.get_neighbours(), self.corpus.deprel
+        return deprel[neighbours.index(sentence1, head1 - 1)] == deprel[neighbours.index(sentence2, other - 1)]
+
+    def pos_mask(self, columns: np.ndarray, pos_filter: str = None) -> np.ndarray:
+        """vectorized apply_pos_heuristic()"""
+        sentence1, word1_1, word2_1, _, _, _, sentence2, word1_2, word2_2, _, _, _ = columns.T
+        tag = self.corpus.pos_tags.get(self.config.pos_filter if pos_filter is None else pos_filter)
+        if tag is None:
+            return np.ones(len(columns), dtype=bool)
+        neighbours, upos = self.get_neighbours(), self.corpus.upos
+        pos1_1, pos2_1 = upos[neighbours.index(sentence1, word1_1 - 1)], upos[neighbours.index(sentence1, word2_1 - 1)]
+        pos1_2, pos2_2 = upos[neighbours.index(sentence2, word1_2 - 1)], upos[neighbours.index(sentence2, word2_2 - 1)]
+        involved = (pos1_1 == tag) | (pos2_1 == tag) | (pos1_2 == tag) | (pos2_2 == tag)
+        return ~involved | ((pos1_1 == pos1_2) & (pos2_1 == pos2_2))
+
+    def sweep(self, configurations: list) -> dict:
+        """applies the heuristics of several configurations in one pass over the raw variation nuclei
+        every heuristic (and the pos heuristic per POS filter) is evaluated once per raw variation nucleus,
+        the results are stored as bits; the variation nuclei accepted by a configuration are saved
+        into OUTPUT_FILE with -<name> appended to the file name, returns their numbers per configuration name"""
+        raw = self.variation_nuclei_raw
+        non_fringe = any(config.non_fringe for config in configurations)
+        nil_internal_context = any(config.nil_internal_context for config in configurations)
+        dependency_context = any(config.dependency_context for config in configurations)
+        pos_filters = list(dict.fromkeys(config.pos_filter for config in configurations if config.pos))
+
+        bits = np.zeros(len(raw), dtype=np.int64)
+        raw_columns = self.get_raw_columns(raw)
+        with self.progress('sweep', len(raw)) as bar:
+            for start in range(0, len(raw), HEURISTICS_BATCH_SIZE):
+                bar.update(start)
+                columns = self.get_range_columns(*raw_columns, start, start + HEURISTICS_BATCH_SIZE)
+                nil = columns[:, -1].astype(bool)
+                passed = bits[start:start + HEURISTICS_BATCH_SIZE]
+
+                # a context heuristic which does not apply to the pair is passed
+                passed[self.non_fringe_mask(columns) if non_fringe else nil] |= NON_FRINGE_BIT
+                passed[self.nil_internal_context_mask(columns) if nil_internal_context else ~nil] |= \
+                    NIL_INTERNAL_CONTEXT_BIT
+                if dependency_context:
+                    passed[self.dependency_context_mask(columns)] |= DEPENDENCY_CONTEXT_BIT
+                for k, pos_filter in enumerate(pos_filters):
+                    passed[self.pos_mask(columns, pos_filter)] |= POS_BIT << k
+
+        counts = dict()
+        default = self.config
+        for config in configurations:
+            mask = 0
+            if config.non_fringe:
+                mask |= NON_FRINGE_BIT
+            if config.nil_internal_context:
+                mask |= NIL_INTERNAL_CONTEXT_BIT
+            if config.dependency_context:
+                mask |= DEPENDENCY_CONTEXT_BIT
+            if config.pos:
+                mask |= POS_BIT << pos_filters.index(config.pos_filter)
+
+            # NO_REPETITION depends on the order of the accepted variation nuclei, it stays a serial pass
+            root, extension = os.path.splitext(OUTPUT_FILE)
+            filename = "{}-{}{}".format(root, config.name, extension)
+            self.config = config
+            self.variation_nuclei = list()
+            self.used_items = set()
+            self.open_output(filename)
+            try:
+                for i in np.flatnonzero((bits & mask) == mask).tolist():
+                    item1, item2 = raw[i]
+                    if not config.no_repetition or self.eliminate_duplicates(item1, item2):
+                        self.add_variation_nucleus(item1, item2)
+
+                counts[config.name] = len(self.variation_nuclei)
+                print("{}: {} variation nuclei".format(config.name, counts[config.name]))
+                self.close_output(filename)
+            finally:
+                self.close_writer()
+        self.config = default
+        return counts
+
+    def add_variation_nucleus(self, item1: Item, item2: Item):
+        """stores an accepted variation nucleus and indexes its items"""
+        self.variation_nuclei.append((item1, item2))
+        if self.writer is not None:
+            self.writer.write(item1, item2)
+        if self.config.no_repetition:
+            self.used_items.add(item1)
+            self.used_items.add(item2)
+
+    def apply_label_independent_heuristics(self, item1: Item, item2: Item) -> bool:
+        """applies the heuristics which do not depend on the labels of the items
+        the labels of an item may still change until all sentences are analyzed (overlaps),
+        the dependency context heuristic therefore has to wait for the complete nuclei trie"""
+        if self.config.non_fringe and not self.apply_non_fringe_heuristic(item1, item2):
+            self.rejections['non_fringe'] += 1
+            return False
+
+        if self.config.pos and not self.apply_pos_heuristic(item1, item2):
+            self.rejections['pos'] += 1
+            return False
 
-    def eliminate_duplicates(self, item1: Item, item2: Item):
-        for vn in self.variation_nuclei:
-            if item1 == vn[0] or item1 == vn[1] or item2 == vn[0] or item2 == vn[1]:
-                return False
         return True
 
+    def add_raw_variation_nuclei(self, variation_nuclei: list, count: int = None):
+        """stores the raw variation nuclei found among the dependency pairs
+        in streaming mode only the ones that can still be accepted are kept
+        count is the number of raw variation nuclei, if they were not all formed (hash join)"""
+        self.raw_count += len(variation_nuclei) if count is None else count
+        if STREAMING:
+            variation_nuclei = [vn for vn in variation_nuclei if self.apply_label_independent_heuristics(*vn)]
+        self.variation_nuclei_raw.extend(variation_nuclei)
+
+    def eliminate_duplicates(self, item1: Item, item2: Item):
+        """checks whether none of the items is part of an already accepted variation nucleus"""
+        return item1 not in self.used_items and item2 not in self.used_items
+
     def apply_dependency_context_heuristic(self, item1: Item, item2: Item):
         """checks whether the head of the first variation nucleus is used in the same function in the other instance"""
-        sentence1 = self.sentences[item1.sentence]
-        head = sentence1[item1.head() - 1]
-        head_function = head[7]
-
-        sentence2 = self.sentences[item2.sentence]
-        item1_label = item1.get_label()
+        corpus = self.corpus
+        head_function = corpus.deprel_view[corpus.index(item1.sentence, item1.head() - 1)]
 
         # retrieves the desired dependency
-        if isinstance(item1_label, set):
-            other = sentence2[item2.head() - 1]
-        elif item1_label.endswith('L'):
-            other = sentence2[item2.word1 - 1]
+        if item1.has_overlap():
+            other = item2.head()
+        elif item1.head() == item1.word1:
+            other = item2.word1
         else:
-            other = sentence2[item2.word2 - 1]
-        other_function = other[7]
+            other = item2.word2
+        other_function = corpus.deprel_view[corpus.index(item2.sentence, other - 1)]
 
         return True if head_function == other_function else False
 
     def apply_nil_internal_context_heuristics(self, item1: Item, item2: Item):
         """checks whether the two nuclei have the same internal context"""
-
-        def get_internal_context(item: Item):
-            """helper method to retrieve the internal context"""
-            internal_context = list()
-            sentence = self.sentences[item.sentence]
-
-            # go through each word token in between, ignore punctuation
-            for i in range(item.word1, item.word2 - 1):
-                line = sentence[i]
-                if line[3] == 'PUNCT':
-                    continue
-                internal_context.append(line[1])
-            return internal_context
-
-        context1 = get_internal_context(item1)
-        context2 = get_internal_context(item2)
+        context1 = self.get_internal_context(item1)
+        context2 = self.get_internal_context(item2)
 
         if context1 == context2:
             if context1:
                 return True
         return False
 
-    def apply_non_fringe_heuristic(self, item1: Item, item2: Item):
-        """compares the surrounding words of the two nucleus items"""
+    def get_internal_context(self, item: Item) -> list:
+        """helper method to retrieve the internal context"""
+        return self.internal_context(item.sentence, item.word1, item.word2)
 
-        def get_surrounding(item: Item):
-            """helper method to get the immediate context"""
-            sentence = self.sentences[item.sentence]
-            l1, r1, l2, r2 = "", "", "", ""
-
-            # make sure not to leave the boundaries of the sentence
-            # assign an empty string for 'no context'
-            if item.word1 > 1:
-                l1_item = sentence[item.word1 - 2]
-                if l1_item[3] == 'PUNCT':
-                    if item.word1 > 2:
-                        l1_item = sentence[item.word1 - 3]
-                        l1 = l1_item[1] if l1_item[3] != 'PUNCT' else ""
-                else:
-                    l1 = l1_item[1]
-
-            # right context of first item
-            r1_item = sentence[item.word1]
-            if r1_item[3] == 'PUNCT':
-                r1_item = sentence[item.word1 + 1]
-            r1 = r1_item[1]
-
-            # left context of second item
-            l2_item = sentence[item.word2 - 2]
-            if l2_item[3] == 'PUNCT':
-                l2_item = sentence[item.word2 - 3]
-            l2 = l2_item[1]
-
-            # right context of second item
-            if item.word2 < len(sentence):
-                r2_item = sentence[item.word2]
-                if r2_item[3] == 'PUNCT':
-                    if item.word2 < len(sentence) - 1:
-                        r2_item = sentence[item.word2 + 1]
-                        r2 = r2_item[1] if r2_item[3] != 'PUNCT' else ""
-                else:
-                    r2 = r2_item[1]
+    def internal_context(self, sentence_id: int, word1: int, word2: int) -> list:
+        """returns the word forms between the two (1-based) words of the sentence, without punctuation"""
+        corpus = self.corpus
+        offset = corpus.offsets_view[sentence_id]
+        start, end = offset + word1, offset + word2 - 1
+        punct = corpus.punct
 
-            return [l1, r1, l2, r2]
+        # go through each word token in between, ignore punctuation
+        form, upos = corpus.form_view, corpus.upos_view
+        return [form[i] for i in range(start, end) if upos[i] != punct]
 
-        context1 = get_surrounding(item1)
-        context2 = get_surrounding(item2)
+    def apply_non_fringe_heuristic(self, item1: Item, item2: Item):
+        """compares the surrounding words of the two nucleus items"""
+        context1 = self.get_surrounding(item1)
+        context2 = self.get_surrounding(item2)
         return True if context1 == context2 else False
 
-    def apply_pos_heuristic(self, item1: Item, item2: Item):
-        """compares the part-of-speech tags of the words"""
-
-        def get_pos_tags(item: Item):
-            """helper method to retrieve the pos tags"""
-            sentence = self.sentences[item.sentence]
-            pos1 = sentence[item.word1 - 1][3]
-            pos2 = sentence[item.word2 - 1][3]
+    def get_surrounding(self, item: Item) -> list:
+        """helper method to get the immediate context
+        a punctuation token next to the item is skipped, -1 stands for 'no context'"""
+        return self.get_neighbours().surrounding(item.sentence, item.word1, item.word2)
 
-            return pos1, pos2
+    def apply_pos_heuristic(self, item1: Item, item2: Item, pos_filter: str = None):
+        """compares the part-of-speech tags of the words, by default with the POS filter of the configuration"""
+        item1_pos = self.get_pos_tags(item1)
+        item2_pos = self.get_pos_tags(item2)
+        pos_filter = self.corpus.pos_tags.get(self.config.pos_filter if pos_filter is None else pos_filter)
 
-        item1_pos = get_pos_tags(item1)
-        item2_pos = get_pos_tags(item2)
-
-        # filter out the nuclei which contain the POS_FILTER tag and differ wrt. their pos tags
-        if POS_FILTER in item1_pos or POS_FILTER in item2_pos:
+        # filter out the nuclei which contain the POS filter tag and differ wrt. their pos tags
+        if pos_filter in item1_pos or pos_filter in item2_pos:
             return True if item1_pos == item2_pos else False
         return True
 
-    def collect_dependency_pair(self, sentence: list, item: list, sentence_id: int):
+    def get_pos_tags(self, item: Item) -> tuple:
+        """helper method to retrieve the pos tags"""
+        corpus = self.corpus
+        pos1 = corpus.upos_view[corpus.index(item.sentence, item.word1 - 1)]
+        pos2 = corpus.upos_view[corpus.index(item.sentence, item.word2 - 1)]
+
+        return pos1, pos2
+
+    def get_join_key(self, item: Item, internal: bool, function_position: int = None):
+        """
+        computes the key of an item for the hash join of the heuristics: two items pass the context and pos
+        heuristics (and with function_position given, the dependency context heuristic) exactly if their keys are equal
+        internal selects the internal context (pairs with NIL items) instead of the surrounding words,
+        function_position is the (1-based) word whose dependency label is compared, the head of the labelled item
+        returns None if the item can not pass the heuristics at all
+        """
+        config = self.config
+        context, function, pos = None, None, None
+        if not internal:
+            if config.non_fringe:
+                context = tuple(self.get_surrounding(item))
+        elif config.nil_internal_context:
+            context = tuple(self.get_internal_context(item))
+            if not context:
+                return None
+
+        if config.dependency_context and function_position is not None:
+            function = self.corpus.deprel_view[self.corpus.index(item.sentence, function_position - 1)]
+
+        if config.pos:
+            # the tags only matter if the POS filter tag is among them
+            pos_tags = self.get_pos_tags(item)
+            if self.corpus.pos_tags.get(config.pos_filter) in pos_tags:
+                pos = pos_tags
+
+        return context, function, pos
+
+    def collect_dependency_pair(self, sentence: Sentence, word_id: int, sentence_id: int):
         """creates the dependency pair of the item in the sentence
         & checks for variation nuclei within the already stored nuclei"""
 
         # retrieve the information from the current item
-        word_id = int(item[0])
-        word = item[1]
-        head_id = int(item[6])
-        label = item[7]
+        word = sentence.forms[word_id - 1]
+        head_id = sentence.heads[word_id - 1]
+        left, right = self.label_ids[sentence.deprels[word_id - 1]]
 
         # create the dependency pair regarding directedness
-        head = sentence[head_id - 1][1]
+        head = sentence.forms[head_id - 1]
         if head_id == 0:
-            label = 'root-L'
-            vn = self.nuclei.add_item('root', word, sentence_id, 0, word_id, label)
+            vn = self.nuclei.add_item(self.corpus.root, word, sentence_id, 0, word_id, self.root_label)
         elif head_id > word_id:
-            label = label + '-R'
-            vn = self.nuclei.add_item(word, head, sentence_id, word_id, head_id, label)
+            vn = self.nuclei.add_item(word, head, sentence_id, word_id, head_id, right)
         elif head_id < word_id:
-            label = label + '-L'
-            vn = self.nuclei.add_item(head, word, sentence_id, head_id, word_id, label)
+            vn = self.nuclei.add_item(head, word, sentence_id, head_id, word_id, left)
         else:
             return
 
-        for v in vn:
-            self.variation_nuclei_raw.append(v)
+        self.add_raw_variation_nuclei(vn)
 
-    def collect_nil_items(self, sentence: list, item: list, sentence_id: int):
+    def collect_nil_items(self, sentence: Sentence, word_id: int, sentence_id: int, demanded: dict = None):
         """iterates through the sentence and fills up the trie structure
-        with every NIL item regarding the specified item"""
+        with every NIL item regarding the specified item
+        if given, only the second words contained in demanded are considered"""
 
         # retrieve the information from the current item
-        word_id = int(item[0])
-        word = item[1]
-        head_id = int(item[6])
+        forms, upos = sentence.forms, sentence.upos
+        word = forms[word_id - 1]
+        punct = self.corpus.punct
+
+        # word forms related to the current item by a dependency to its right,
+        # and the ones related to each other item to its left
+        right, left = sentence.related_forms()
+        related = right[word_id - 1]
 
         # search the other items in the sentence
         for i in range(word_id, len(sentence)):
-            other_item = sentence[i]
-
-            if other_item[3] == 'PUNCT':
+            if upos[i] == punct:
+                continue
+            other_word = forms[i]
+            if demanded is not None and other_word not in demanded:
                 continue
-            other_word = other_item[1]
-            other_word_id = int(other_item[0])
-            other_head_id = int(other_item[6])
 
             # skip nuclei which are type-identical to
             # and overlap with a genuine dependency relation in the same sentence
-            overlap = False
-            for j in range(word_id, len(sentence)):
-                sus = sentence[j]
-                if sus[1] == other_word:
-                    if int(sus[6]) == word_id or head_id == int(sus[0]):
-                        overlap = True
-                        break
-            for j in range(0, other_word_id - 1):
-                sus = sentence[j]
-                if sus[1] == word:
-                    if int(sus[6]) == other_word_id or other_head_id == int(sus[0]):
-                        overlap = True
-                        break
-
-            if not overlap:
-                self.nil.add_item(word, other_word, sentence_id, word_id, other_word_id)
-
-    def detect_errors(self, filename: str):
-        """ 'main' method to connect the functions in this class"""
+            if other_word in related or word in left[i]:
+                continue
+
+            self.nil.add_item(word, other_word, sentence_id, word_id, i + 1)
+
+    def detect_errors(self, filename: str, configurations: list = None):
+        """ 'main' method to connect the functions in this class
+        the treebank may also be given as several files, a directory or a glob pattern (see read_data())
+        with a list of configurations, the heuristics of all of them are applied in one sweep(),
+        whose numbers of variation nuclei per configuration name are returned"""
+        if configurations and (STREAMING or HASH_JOIN):
+            raise ValueError("a sweep needs the unfiltered raw variation nuclei, STREAMING and HASH_JOIN must be off")
 
         # clear all class variables
-        self.sentences.clear()
+        self.corpus.clear()
         self.nuclei.clear()
+        self.variation_nuclei_raw.clear()
         self.variation_nuclei.clear()
+        self.used_items.clear()
         self.nil.clear()
+        self.context_index = None
+        self.neighbours = None
         self.nuclei_count = 0
+        self.raw_count = 0
+        self.rejections = dict.fromkeys(HEURISTICS, 0)
+        metrics = self.metrics = self.new_metrics()
+
+        cache = Cache(CACHE_DIR, find_treebanks(filename), self.get_analysis_settings()) if USE_CACHE else None
+        phase = None
+        if cache:
+            with metrics.phase('resume'):
+                phase = self.resume(cache)
+
+        if phase is None:
+            print("Read data...\n")
+            with metrics.phase('read_data'):
+                self.read_data(filename)
+            self.save_snapshot(cache, 'corpus')
+        if phase in (None, 'corpus'):
+            with metrics.phase('analyze_sentences'):
+                self.analyze_sentences()
+            self.save_snapshot(cache, 'nuclei')
+        if phase != 'raw':
+            print("I found {} variation nuclei without heuristics. \n".format(self.raw_count))
+
+        if not configurations:
+            self.open_output(OUTPUT_FILE)
+        try:
+            if STREAMING:
+                # the dependency pairs come first, the NIL pairs are filtered while they are produced
+                with metrics.phase('apply_heuristics'):
+                    self.apply_heuristics()
+                    self.variation_nuclei_raw.clear()
+                    with self.progress('analyze_nil', self.nuclei_count) as bar:
+                        self.apply_heuristics(self.iter_nil_variation_nuclei(bar))
+            elif phase != 'raw':
+                with metrics.phase('analyze_nil'):
+                    self.analyze_nil()
+                self.save_snapshot(cache, 'raw')
+            print("After adding NIL items, "
+                  "I found {} variation nuclei without heuristics. \n".format(self.raw_count))
+            if configurations:
+                with metrics.phase('sweep'):
+                    counts = self.sweep(configurations)
+                self.finish_metrics()
+                return counts
+            if not STREAMING:
+                with metrics.phase('apply_heuristics'):
+                    self.apply_heuristics()
+            print("After applying heuristics, I found {} variation nuclei. \n".format(len(self.variation_nuclei)))
+            with metrics.phase('save_variation_nuclei'):
+                self.close_output(OUTPUT_FILE)
+            self.finish_metrics()
+        finally:
+            # a failed run still leaves a complete file of the variation nuclei accepted so far
+            self.close_writer()
+
+    def progress(self, phase: str, max_value: int) -> Progress:
+        """returns the progress report of a loop of the phase, a context manager whose update() is called per item"""
+        return Progress(phase, max_value, PROGRESS, PROGRESS_INTERVAL, self.progress_callback)
+
+    def new_metrics(self) -> Metrics:
+        """returns the metrics for a new run, which are written to stderr as well in the json progress mode"""
+        return Metrics(TRACE_MEMORY, emit_json if PROGRESS == 'json' and self.progress_callback is None else None)
+
+    def finish_metrics(self):
+        """adds the counts of the run to the metrics and saves them into METRICS_FILE (if set)
+        with the hash join, the raw variation nuclei which do not share the join key with a NIL item are never formed,
+        their rejections are not counted per heuristic"""
+        self.metrics.set_counts({'sentences': len(self.corpus),
+                                 'tokens': len(self.corpus.form),
+                                 'nuclei': self.nuclei_count,
+                                 'nuclei_word_pairs': sum(len(level2) for level2 in self.nuclei.values()),
+                                 'nil_items': self.nil.count(),
+                                 'nil_word_pairs': sum(len(level2) for level2 in self.nil.values()),
+                                 'raw_variation_nuclei': self.raw_count,
+                                 'variation_nuclei': len(self.variation_nuclei),
+                                 'rejections': dict(self.rejections)})
+        if METRICS_FILE:
+            self.metrics.save(METRICS_FILE)
+
+    def open_output(self, filename: str):
+        """opens the writer of the streaming output formats"""
+        if EXTEND_CONTEXTS and OUTPUT_FORMAT != 'json':
+            raise ValueError("the shared contexts (EXTEND_CONTEXTS) are only saved in the json output format")
+        if GROUPED_OUTPUT and OUTPUT_FORMAT != 'json':
+            raise ValueError("the grouped records (GROUPED_OUTPUT) are only saved in the json output format")
+        if OUTPUT_FORMAT == 'jsonl':
+            self.writer = JsonLinesWriter(filename, self.corpus)
+        elif OUTPUT_FORMAT == 'binary':
+            self.writer = BinaryWriter(filename, self.corpus)
+        elif OUTPUT_FORMAT != 'json':
+            raise ValueError("unknown output format {}".format(OUTPUT_FORMAT))
+
+    def close_output(self, filename: str):
+        """closes the writer of the streaming output formats, saves the variation nuclei in the json format"""
+        if self.writer is not None:
+            self.close_writer()
+        else:
+            self.save_variation_nuclei(filename)
+
+    def close_writer(self):
+        """closes the writer of the streaming output formats (if one is open)"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def get_analysis_settings(self) -> dict:
+        """returns the settings which change the content of the snapshots after reading the data"""
+        settings = {'STREAMING': STREAMING, 'HASH_JOIN': HASH_JOIN, 'DEMAND_DRIVEN_NIL': DEMAND_DRIVEN_NIL}
+        if STREAMING or HASH_JOIN:
+            # the raw variation nuclei are filtered by the heuristics already
+            settings.update(self.config.get_settings())
+            del settings['no_repetition']
+        return settings
+
+    def save_snapshot(self, cache: Cache, phase: str):
+        """saves the state reached after the phase (if a cache is used)"""
+        if cache is None or (phase == 'raw' and STREAMING):
+            return
+        if phase == 'corpus':
+            cache.save(phase, {'corpus': self.corpus})
+            return
+        # the items refer to the labels by their interned ids, the raw variation nuclei share their items with the tries
+        # the tries are saved with every phase, the counts of a run and save_state() need them after a resume
+        cache.save(phase, {'labels': LABELS.strings},
+                   {'nuclei': self.nuclei,
+                    'nil': self.nil,
+                    'nuclei_count': self.nuclei_count,
+                    'raw_count': self.raw_count,
+                    'variation_nuclei_raw': self.variation_nuclei_raw})
+
+    def resume(self, cache: Cache):
+        """loads the snapshots of the last completed phase, returns the phase (None if nothing was loaded)"""
+        phase = cache.last_phase()
+        if phase is None:
+            return None
+        self.corpus = dict(cache.load('corpus'))['corpus']
+        if phase == 'corpus':
+            print("Loaded the corpus from the cache\n")
+            return phase
+
+        entries = cache.load(phase)
+        # the labels come first, the items refer to them by their interned ids
+        _, labels = next(entries)
+        if not self.restore_labels(labels):
+            entries.close()
+            print("Loaded the corpus from the cache\n")
+            return 'corpus'
+        self.__dict__.update(entries)
+        print("Loaded the {} phase from the cache\n".format(phase))
+        return phase
+
+    def restore_labels(self, labels: list) -> bool:
+        """interns the labels of a saved state with the ids they had when it was saved
+        returns False if this is impossible, because the labels were interned in a different order in this process"""
+        if any(label != known for label, known in zip(labels, LABELS.strings)):
+            return False
+        for label in labels:
+            LABELS.add(label)
+        self.intern_labels()
+        return True
 
-        print("Read data...\n")
-        self.read_data(filename)
-        self.analyze_sentences()
-        print("I found {} variation nuclei without heuristics. \n".format(len(self.variation_nuclei_raw)))
-
-        self.analyze_nil()
-        print("After adding NIL items, "
-              "I found {} variation nuclei without heuristics. \n".format(len(self.variation_nuclei_raw)))
-        self.apply_heuristics()
-        print("After applying heuristics, I found {} variation nuclei. \n".format(len(self.variation_nuclei)))
-        self.save_variation_nuclei()
-
-    def read_data(self, filename: str) -> None:
+    def save_state(self, filename: str):
+        """saves everything add_sentences() needs to continue the detection later on (in another process)"""
+        # the accepted variation nuclei and the used items share their items with the tries
+        save_entries(filename, {'settings': self.get_analysis_settings()}, {'labels': LABELS.strings},
+                     {'corpus': self.corpus,
+                      'nuclei': self.nuclei,
+                      'nil': self.nil,
+                      'nuclei_count': self.nuclei_count,
+                      'raw_count': self.raw_count,
+                      'variation_nuclei': self.variation_nuclei,
+                      'used_items': self.used_items})
+
+    def load_state(self, filename: str):
+        """loads a state saved by save_state(), the tries have to be built with the current analysis settings"""
+        entries = load_entries(filename)
+        _, settings = next(entries)
+        if settings != self.get_analysis_settings():
+            entries.close()
+            raise ValueError("{} was saved with the analysis settings {}, not with the current ones {}".format(
+                filename, settings, self.get_analysis_settings()))
+        _, labels = next(entries)
+        if not self.restore_labels(labels):
+            entries.close()
+            raise ValueError("the labels of {} were interned in a different order in this process".format(filename))
+        self.__dict__.update(entries)
+        self.variation_nuclei_raw = VariationNuclei()
+
+    def add_sentences(self, filename: str) -> list:
         """
-        reads in a text file in CONLL-U format
+        incremental version of detect_errors() for sentences appended to the treebank
+        reads the new sentences and pairs their items with the items of all sentences,
+        the items of the previous sentences are only paired with the new items
+        returns the new variation nuclei, which are appended to variation_nuclei as well
+        apart from their order, the variation nuclei are the ones of a full rerun
+        (except for NO_REPETITION, which does not revise the variation nuclei accepted before)
         """
-        with open(filename, 'r', encoding='utf8') as f:
-            f.readline()  # ignore the 'newdoc' tag
-            line = f.readline()
-            sentence = list()
-            while line:
-                # blank line indicates a new sentence
-                if line == '\n':
-                    self.sentences.append(sentence)
-                    sentence = list()
-                else:
-
-                    # prepare & filter out the lines
-                    line = line.split('\t')
-                    if line[0].startswith('#') or '-' in line[0]:
-                        pass
-                    else:
-                        sentence.append(line)
-                line = f.readline()
-
-            # last sentence in the file
-            if sentence:
-                self.sentences.append(sentence)
-
-    def save_variation_nuclei(self):
-        """saves the "raw" variation nuclei (without heuristics) into a json file"""
+        if DEMAND_DRIVEN_NIL:
+            raise ValueError("the incremental detection needs all NIL items, DEMAND_DRIVEN_NIL must be off")
+        start = len(self.corpus)
+        metrics = self.metrics = self.new_metrics()
+        with metrics.phase('read_data'):
+            self.read_data(filename)
+            self.intern_labels()
+        self.context_index = None
+        self.neighbours = None
+
+        with metrics.phase('analyze_sentences'):
+            # the new sentences are recorded on their own first, like a shard
+            nuclei, nil = self.nuclei, self.nil
+            self.nuclei, self.nil = Trie(detect=False), NilTrie()
+            with self.progress('analyze_sentences', len(self.corpus)) as bar:
+                self.analyze_sentence_range(start, len(self.corpus), True, bar)
+            new_nuclei, new_nil = self.nuclei, self.nil
+            self.nuclei, self.nil = nuclei, nil
+
+            self.variation_nuclei_raw.clear()
+            self.add_raw_variation_nuclei(*self.nuclei.add_trie(new_nuclei))
+        with metrics.phase('analyze_nil'):
+            new_nil_counts = {(word1, word2): len(indices) // 3
+                              for word1, level2 in new_nil.items() for word2, indices in level2.items()}
+            self.nil.merge(new_nil)
+            self.variation_nuclei_raw.extend(self.iter_new_nil_variation_nuclei(new_nuclei, new_nil_counts, start))
+        print("I found {} new variation nuclei without heuristics. \n".format(len(self.variation_nuclei_raw)))
+
+        accepted = len(self.variation_nuclei)
+        with metrics.phase('apply_heuristics'):
+            self.apply_heuristics()
+        print("After applying heuristics, I found {} new variation nuclei. \n".format(
+            len(self.variation_nuclei) - accepted))
+        self.finish_metrics()
+        return self.variation_nuclei[accepted:]
+
+    def iter_new_nil_variation_nuclei(self, new_nuclei: Trie, new_nil_counts: dict, start: int):
+        """yields the raw variation nuclei with NIL items that involve the sentences from start on
+        new_nil_counts holds the number of new NIL items per word pair, they are the last ones of their word pair"""
+        pairs = dict.fromkeys((word1, word2) for word1, level2 in new_nuclei.items() for word2 in level2)
+        pairs.update(dict.fromkeys(new_nil_counts))
+        for word1, word2 in pairs:
+            items = self.nuclei.find_pairs(word1, word2)
+            total = self.nil.count_pairs(word1, word2)
+            if not items or not total:
+                continue
+            new_nil_items = self.nil.find_pairs(word1, word2, total - new_nil_counts.get((word1, word2), 0))
+
+            # the new items are the last ones of the word pair, only they are paired with the old NIL items
+            first = len(items)
+            while first and items[first - 1].sentence >= start:
+                first -= 1
+            nil_items = self.nil.find_pairs(word1, word2) if first < len(items) else new_nil_items
+            if not new_nil_items:
+                items = items[first:]
+
+            for item in items:
+                if item.has_overlap():
+                    # skip items with overlaps
+                    continue
+                for nil_item in nil_items if item.sentence >= start else new_nil_items:
+                    self.raw_count += 1
+                    yield item, nil_item
 
-        def get_plain_words(item: Item):
-            """helper method to retrieve the plain words"""
-            sentence = self.sentences[item.sentence]
-            w1 = sentence[item.word1 - 1][1]
-            w2 = sentence[item.word2 - 1][1]
-            return w1, w2
+    def read_data(self, source) -> None:
+        """
+        reads in files in CONLL-U format, which may be compressed (gzip, xz or bzip2)
+        the source is a file, a directory, a glob pattern or a list of them (see corpus.find_treebanks())
+        the files are split into chunks at sentence boundaries, with NUM_WORKERS > 1 the chunks are parsed by a pool
+        of processes and appended in order, so the sentence ids are the ones of reading the files one after another
+        """
+        chunks = [chunk for filename in find_treebanks(source) for chunk in split_treebank(filename, READ_CHUNK_SIZE)]
+        with self.progress('read_data', len(chunks)) as bar:
+            if NUM_WORKERS > 1 and len(chunks) > 1:
+                with multiprocessing.Pool(min(NUM_WORKERS, len(chunks))) as pool:
+                    for i, corpus in enumerate(pool.imap(_read_chunk, chunks)):
+                        self.corpus.extend(corpus)
+                        bar.update(i + 1)
+            else:
+                for i, chunk in enumerate(chunks):
+                    self.corpus.read_chunk(chunk)
+                    bar.update(i + 1)
+
+    def save_variation_nuclei(self, filename: str = None):
+        """saves the "raw" variation nuclei (without heuristics) into a json file (by default OUTPUT_FILE)"""
+        filename = filename or OUTPUT_FILE
+        if GROUPED_OUTPUT:
+            # one record per line, the records are compact already
+            with open(filename, "w") as fp:
+                fp.write("[\n" + ",\n".join(json.dumps(record) for record in self.group_variation_nuclei()) + "\n]\n")
+            return
 
+        contexts = self.get_shared_contexts(self.variation_nuclei) if EXTEND_CONTEXTS else None
         variation_nuclei = list()
-        for vn in self.variation_nuclei:
-            word1, word2 = get_plain_words(vn[0])
+        for i in self.order_by_context(contexts) if contexts else range(len(self.variation_nuclei)):
+            vn = self.variation_nuclei[i]
+            word1, word2 = self.get_plain_words(vn[0])
             item1 = vn[0].to_list(word1, word2)
             item2 = vn[1].to_list(word1, word2)
-            variation_nuclei.append((item1, item2))
+            # the shared left and right context follows the items
+            variation_nuclei.append((item1, item2, contexts[i]) if contexts else (item1, item2))
 
-        with open("data/variationNuclei.json", "w") as fp:
+        with open(filename, "w") as fp:
             json.dump(variation_nuclei, fp, indent=4)
 
+    def get_shared_contexts(self, groups: list) -> list:
+        """returns the lengths of the longest left and right contexts shared by all items of a group
+        as [left, right] for every group (a variation nucleus is a group of two items)"""
+        if not groups:
+            return []
+        if self.context_index is None:
+            self.context_index = ContextIndex(self.corpus)
+        starts = np.cumsum([0] + [len(group) for group in groups[:-1]])
+        left, right = self.context_index.shared_contexts([item for group in groups for item in group], starts)
+        return np.stack((left, right), axis=1).tolist()
+
+    @staticmethod
+    def order_by_context(contexts: list):
+        """returns the indices of the contexts in the order they are saved in (longest first with SORT_BY_CONTEXT)"""
+        if not SORT_BY_CONTEXT:
+            return range(len(contexts))
+        return sorted(range(len(contexts)), key=lambda i: -sum(contexts[i]))
+
+    def get_plain_words(self, item: Item):
+        """helper method to retrieve the plain words"""
+        w1 = self.corpus.word(item.sentence, item.word1)
+        w2 = self.corpus.word(item.sentence, item.word2)
+        return w1, w2
+
+    def group_variation_nuclei(self) -> list:
+        """groups the variation nuclei by their word pair, returns one record per word pair holding
+        the number of instances per label (NIL included), the locations of these instances
+        and the variation nuclei as pairs of indices into the instances (numbered across all labels)
+        the word pairs and labels are ordered by their first occurrence, NIL comes last
+        with EXTEND_CONTEXTS, a record also holds the context shared by all of its instances"""
+        groups = dict()
+        for vn in self.variation_nuclei:
+            words = self.get_plain_words(vn[0])
+            group = groups.get(words)
+            if group is None:
+                group = groups[words] = (dict(), list())
+            instances, pairs = group
+            for item in vn:
+                # the location identifies an item, the word pair is implied by it
+                if item not in instances:
+                    if item.is_nil():
+                        instances[item] = 'NIL'
+                    else:
+                        instances[item] = ', '.join(LABELS.strings[la] for la in item.iter_label_ids())
+            pairs.append(vn)
+
+        records = list()
+        for (word1, word2), (instances, pairs) in groups.items():
+            by_label = dict()
+            for item, label in instances.items():
+                if label != 'NIL':
+                    by_label.setdefault(label, []).append(item)
+            for item, label in instances.items():
+                if label == 'NIL':
+                    by_label.setdefault(label, []).append(item)
+
+            numbers = dict()
+            for items in by_label.values():
+                for item in items:
+                    numbers[item] = len(numbers)
+            records.append({'word1': word1,
+                            'word2': word2,
+                            'labels': {label: len(items) for label, items in by_label.items()},
+                            'instances': {label: [[item.sentence, item.word1, item.word2] for item in items]
+                                          for label, items in by_label.items()},
+                            'pairs': [[numbers[item1], numbers[item2]] for item1, item2 in pairs]})
+
+        if EXTEND_CONTEXTS:
+            contexts = self.get_shared_contexts([list(instances) for instances, _ in groups.values()])
+            for record, context in zip(records, contexts):
+                record['context'] = context
+            records = [records[i] for i in self.order_by_context(contexts)]
+        return records
+
+
+def _read_chunk(chunk: tuple) -> Corpus:
+    """parses a chunk of a treebank file in a worker process of ErrorDetector.read_data()"""
+    corpus = Corpus()
+    corpus.read_chunk(chunk)
+    return corpus
+
+
+# state of a worker process in ErrorDetector.analyze_shards() and ErrorDetector.iter_checked_batches()
+_worker_detector = None
+_worker_raw_columns = None
+
+
+def _init_worker(corpus: Corpus, labels: list):
+    """initializes the detector of a worker process, the corpus is passed only once per process
+    the labels are interned in the same order as in the main process, so the label ids match"""
+    global _worker_detector
+    for label in labels:
+        LABELS.add(label)
+    _worker_detector = ErrorDetector()
+    _worker_detector.corpus = corpus
+    _worker_detector.intern_labels()
+
+
+def _analyze_shard(shard: tuple):
+    """collects the nuclei (without detection) and the NIL items of a shard of sentences"""
+    start, end, collect_nil = shard
+    detector = _worker_detector
+    detector.nuclei = Trie(detect=False)
+    detector.nil = NilTrie()
+    detector.nuclei_count = 0
+    detector.analyze_sentence_range(start, end, collect_nil)
+    return detector.nuclei.to_columns(), detector.nil.to_columns(), detector.nuclei_count
+
+
+def _collect_demanded_shard(shard: tuple):
+    """collects the NIL items of a shard of sentences whose word pairs are among the given nuclei pairs"""
+    start, end, pairs = shard
+    detector = _worker_detector
+    detector.nil = NilTrie()
+    detector.collect_demanded_nil_items(start, end, pairs)
+    return detector.nil.to_columns()
+
+
+def _init_heuristics_worker(directory: str, pos_tags, punct: int, config: Configuration, raw: bool):
+    """initializes the detector of a worker process of ErrorDetector.iter_checked_batches(),
+    the columns of the corpus, its neighbours (and of the raw variation nuclei) are mapped from the files
+    in the directory"""
+    global _worker_detector, _worker_raw_columns
+    _worker_detector = ErrorDetector(config)
+    corpus = _worker_detector.corpus
+    corpus.pos_tags, corpus.punct = pos_tags, punct
+    corpus.map_columns(directory)
+    _worker_detector.neighbours = Neighbours.load(directory)
+    if raw:
+        arrays = map_arrays(directory, 'raw', RAW_ARRAYS)
+        _worker_raw_columns = tuple(arrays[name] for name in RAW_ARRAYS)
+
+
+def _check_columns(columns: np.ndarray) -> tuple:
+    """checks the columns of a batch, returns which variation nuclei are accepted and the rejections per heuristic"""
+    detector = _worker_detector
+    detector.rejections = dict.fromkeys(HEURISTICS, 0)
+    return detector.check_columns(columns), detector.rejections
+
+
+def _check_range(start: int, end: int) -> tuple:
+    """_check_columns() of the raw variation nuclei start to end - 1"""
+    return _check_columns(ErrorDetector.get_range_columns(*_worker_raw_columns, start, end))
+
 
 if __name__ == '__main__':
     fn = 'data/TuebaDZ_example.txt'
@@ -0,0 +1,133 @@
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import progressbar
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, the peak RSS is not measured there
+    resource = None
+
+
+# number of most allocating lines recorded per phase when the memory is traced
+TOP_ALLOCATIONS = 5
+
+# the clock is read at most this many times per loop, the other updates return right away
+CLOCK_CHECKS = 1000
+
+
+def peak_rss() -> float:
+    """returns the peak resident set size of the process so far in MB (None if unknown)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+def emit_json(record: dict):
+    """writes a record as one json line to stderr"""
+    sys.stderr.write(json.dumps(record) + '\n')
+    sys.stderr.flush()
+
+
+class Progress:
+    """reports the progress of a loop at most every interval seconds
+    mode 'bar' shows a progress bar, 'json' writes json lines to stderr and 'none' reports nothing,
+    a callback (phase, value, max_value) is called instead of both if it is given
+    update() is called per item, it only compares two integers for most of them"""
+
+    def __init__(self, phase: str, max_value: int, mode: str = 'bar', interval: float = 0.5, callback=None):
+        if mode not in ('bar', 'json', 'none'):
+            raise ValueError("unknown progress mode {}".format(mode))
+        self.phase = phase
+        self.max_value = max_value
+        self.interval = interval
+        self.callback = callback
+        self.mode = mode if callback is None else 'callback'
+        self.bar = None
+        self.step = max(1, max_value // CLOCK_CHECKS)
+        self.next_value = 0
+        self.next_time = 0.0
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        if self.mode == 'bar':
+            self.bar = progressbar.ProgressBar(max_value=self.max_value)
+            self.bar.start()
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.report(self.max_value)
+        if self.bar is not None:
+            self.bar.finish(dirty=exc[0] is not None)
+
+    def update(self, value: int):
+        if value < self.next_value or self.mode == 'none':
+            return
+        self.next_value = value + self.step
+        now = time.perf_counter()
+        if now >= self.next_time:
+            self.next_time = now + self.interval
+            self.report(value)
+
+    def report(self, value: int):
+        if self.mode == 'bar':
+            self.bar.update(min(value, self.max_value))
+        elif self.mode == 'json':
+            emit_json({'phase': self.phase, 'progress': value, 'max_value': self.max_value,
+                       'seconds': round(time.perf_counter() - self.start, 3)})
+        elif self.mode == 'callback':
+            self.callback(self.phase, value, self.max_value)
+
+
+class Metrics:
+    """the measurements of a run: wall time and memory per phase, and counts
+    phases maps the name of a phase to its seconds, the peak RSS of the process after it
+    and, when the memory is traced, the peak and the remaining size of the python allocations during the phase
+    and the lines which allocated most of the remaining size (like a tracemalloc snapshot)"""
+
+    def __init__(self, trace_memory: bool = False, emit=None):
+        self.trace_memory = trace_memory
+        self.emit = emit
+        self.phases = dict()
+        self.counts = dict()
+
+    @contextmanager
+    def phase(self, name: str):
+        """measures the code run within the context as the phase name"""
+        trace = self.trace_memory and not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            measurement = {'seconds': round(time.perf_counter() - start, 3), 'peak_rss_mb': peak_rss()}
+            if trace:
+                current, peak = tracemalloc.get_traced_memory()
+                statistics = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]
+                tracemalloc.stop()
+                measurement.update(traced_mb=round(current / 1e6, 1), traced_peak_mb=round(peak / 1e6, 1),
+                                   top_allocations=[[str(stat.traceback), round(stat.size / 1e6, 1)]
+                                                    for stat in statistics])
+            self.phases[name] = measurement
+            if self.emit is not None:
+                self.emit(dict(phase=name, **measurement))
+
+    def set_counts(self, counts: dict):
+        self.counts.update(counts)
+        if self.emit is not None:
+            self.emit({'counts': counts})
+
+    def to_dict(self) -> dict:
+        return {'phases': self.phases, 'counts': self.counts}
+
+    def save(self, filename: str):
+        with open(filename, 'w') as fp:
+            json.dump(self.to_dict(), fp, indent=4)
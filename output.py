@@ -0,0 +1,78 @@
+import json
+import struct
+from array import array
+
+import numpy as np
+
+from corpus import Corpus, Vocabulary
+from trie import Item, LABELS
+
+
+# the binary format: a header, one record of RECORD_SIZE little-endian int32 per variation nucleus,
+# the vocab table as json and a footer with the number of records and the offset of the vocab table
+BINARY_MAGIC = b'VNB1\0\0\0\0'
+RECORD_SIZE = 10
+FOOTER = struct.Struct('<qq')
+
+# number of records the binary writer buffers before writing them
+BUFFER_SIZE = 1 << 16
+
+
+class JsonLinesWriter:
+    """writes the variation nuclei one per line as they are accepted, in the format of the json file"""
+
+    def __init__(self, filename: str, corpus: Corpus):
+        self.corpus = corpus
+        self.file = open(filename, 'w')
+        self.count = 0
+
+    def write(self, item1: Item, item2: Item):
+        word1 = self.corpus.word(item1.sentence, item1.word1)
+        word2 = self.corpus.word(item1.sentence, item1.word2)
+        self.file.write(json.dumps([item1.to_list(word1, word2), item2.to_list(word1, word2)]) + '\n')
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+class BinaryWriter:
+    """writes the variation nuclei as fixed-size records of integers as they are accepted
+    a record holds the location and the label of both items and the word forms of the pair:
+    sentence1, word1_1, word2_1, label1, sentence2, word1_2, word2_2, label2, form1, form2
+    the forms index into the vocabulary of the corpus, the labels into a table of label strings (-1 for NIL)"""
+
+    def __init__(self, filename: str, corpus: Corpus):
+        self.corpus = corpus
+        self.file = open(filename, 'wb')
+        self.file.write(BINARY_MAGIC)
+        self.buffer = array('i')
+        self.labels = Vocabulary()
+        self.count = 0
+
+    def get_label(self, item: Item) -> int:
+        if item.is_nil():
+            return -1
+        return self.labels.add(', '.join(LABELS.strings[la] for la in item.iter_label_ids()))
+
+    def write(self, item1: Item, item2: Item):
+        corpus = self.corpus
+        self.buffer.extend((item1.sentence, item1.word1, item1.word2, self.get_label(item1),
+                            item2.sentence, item2.word1, item2.word2, self.get_label(item2),
+                            corpus.form_view[corpus.index(item1.sentence, item1.word1 - 1)],
+                            corpus.form_view[corpus.index(item1.sentence, item1.word2 - 1)]))
+        self.count += 1
+        if len(self.buffer) >= BUFFER_SIZE * RECORD_SIZE:
+            self.flush()
+
+    def flush(self):
+        # the records are little-endian int32 whatever the byte order and int size of the machine
+        self.file.write(np.asarray(self.buffer, dtype='<i4').tobytes())
+        del self.buffer[:]
+
+    def close(self):
+        self.flush()
+        offset = self.file.tell()
+        self.file.write(json.dumps({'forms': self.corpus.vocab.strings, 'labels': self.labels.strings}).encode())
+        self.file.write(FOOTER.pack(self.count, offset))
+        self.file.close()
@@ -5,25 +5,114 @@ However, many of them were mainly used for testing purposes
 and none of them contributes to the actual error detection process"""
 
 import json
+import os
 from trie import Item
+from output import BINARY_MAGIC, RECORD_SIZE, FOOTER, BUFFER_SIZE
+from sentence_index import SentenceIndex
 from collections import Counter
 import matplotlib.pyplot as plt
 import numpy as np
 
 
 def read_vn(filename):
-    """loads the variation nuclei from a json file"""
+    """loads the variation nuclei from a json, json lines or binary file
+    files with grouped records (GROUPED_OUTPUT) are expanded into the same lists,
+    ordered by word pair instead of the order of detection"""
+    if get_format(filename) != 'json':
+        return list(iter_vn(filename))
+
     result = list()
     with open(filename, "r") as fp:
         variation_nuclei = json.load(fp)
+    if variation_nuclei and isinstance(variation_nuclei[0], dict):
+        return expand_groups(variation_nuclei)
     for vn in variation_nuclei:
-        i1 = vn[0]
-        i2 = vn[1]
+        result.append(parse_vn(vn))
+    return result
+
 
-        item1 = Item(i1[0], i1[1][0], i1[2][0], set(i1[3]) if i1[3] else None)
-        item2 = Item(i2[0], i2[1][0], i2[2][0], set(i2[3]) if i2[3] else None)
-        word1, word2 = i1[1][1], i1[2][1]
-        result.append([item1, item2, word1, word2])
+def parse_vn(vn: list):
+    """turns a variation nucleus of the json format into [item1, item2, word1, word2]"""
+    i1 = vn[0]
+    i2 = vn[1]
+
+    item1 = Item(i1[0], i1[1][0], i1[2][0], set(i1[3]) if i1[3] else None)
+    item2 = Item(i2[0], i2[1][0], i2[2][0], set(i2[3]) if i2[3] else None)
+    word1, word2 = i1[1][1], i1[2][1]
+    return [item1, item2, word1, word2]
+
+
+def get_format(filename) -> str:
+    """tells json, json lines and binary files apart by their first line"""
+    with open(filename, "rb") as fp:
+        first = fp.readline()
+    if first.startswith(BINARY_MAGIC):
+        return 'binary'
+    if first.strip() in (b'[', b'[]'):
+        return 'json'
+    return 'jsonl'
+
+
+def iter_vn(filename):
+    """iterates over the variation nuclei of a file like read_vn() returns them
+    json lines and binary files are read lazily, json files are loaded completely"""
+    file_format = get_format(filename)
+    if file_format == 'json':
+        yield from read_vn(filename)
+    elif file_format == 'jsonl':
+        with open(filename, "r") as fp:
+            for line in fp:
+                yield parse_vn(json.loads(line))
+    else:
+        yield from iter_binary_vn(filename)
+
+
+def iter_binary_vn(filename):
+    """iterates over the records of a binary file (see output.BinaryWriter), chunk by chunk of a memory map"""
+    with open(filename, "rb") as fp:
+        fp.seek(-FOOTER.size, 2)
+        end = fp.tell()
+        count, offset = FOOTER.unpack(fp.read(FOOTER.size))
+        fp.seek(offset)
+        vocab = json.loads(fp.read(end - offset))
+    if not count:
+        return
+
+    forms = vocab['forms']
+    labels = [set(label.split(', ')) for label in vocab['labels']]
+    records = np.memmap(filename, dtype='<i4', mode='r', offset=len(BINARY_MAGIC), shape=(count, RECORD_SIZE))
+    for start in range(0, count, BUFFER_SIZE):
+        for s1, a1, b1, l1, s2, a2, b2, l2, f1, f2 in records[start:start + BUFFER_SIZE].tolist():
+            yield [Item(s1, a1, b1, labels[l1] if l1 >= 0 else None),
+                   Item(s2, a2, b2, labels[l2] if l2 >= 0 else None),
+                   forms[f1], forms[f2]]
+
+
+def read_groups(filename):
+    """loads the grouped records of a json file as (word1, word2, {label: [Item, ...]}, pairs) per word pair
+    the pairs index into the instances numbered across all labels"""
+    with open(filename, "r") as fp:
+        records = json.load(fp)
+    result = list()
+    for record in records:
+        instances = dict()
+        for label, locations in record['instances'].items():
+            labels = set(label.split(', ')) if label != 'NIL' else None
+            instances[label] = [Item(sentence, word1, word2, labels) for sentence, word1, word2 in locations]
+        result.append((record['word1'], record['word2'], instances, record['pairs']))
+    return result
+
+
+def expand_groups(records: list):
+    """turns grouped records into the [item1, item2, word1, word2] lists of read_vn()"""
+    result = list()
+    for record in records:
+        items = list()
+        for label, locations in record['instances'].items():
+            labels = set(label.split(', ')) if label != 'NIL' else None
+            items.extend(Item(sentence, word1, word2, labels) for sentence, word1, word2 in locations)
+        for i1, i2 in record['pairs']:
+            result.append([items[i1], items[i2], record['word1'], record['word2']])
     return result
 
 
@@ -64,23 +153,67 @@ def collect_statistics(filename: str):
         print(pair[0][0] + ';' + pair[0][1] + ';' + str(pair[1]))
 
 
-def compare_results():
-    version1 = ""
-    version2 = ""
+def compare_results(version1: str = "", version2: str = ""):
+    """prints the differences between two result files and converts the added and removed variation nuclei to txt"""
+    added, removed, counts = diff_results(version1, version2)
+    for status in ('added', 'removed', 'unchanged'):
+        print("{} {} variation nuclei".format(sum(counts[status].values()), status))
+        for pair, count in counts[status].most_common():
+            print(pair[0] + ';' + pair[1] + ';' + str(count))
 
-    vn1 = read_vn(version1)
-    vn2 = read_vn(version2)
+    if added:
+        convert_to_txt(added, "result/added.txt")
+    if removed:
+        convert_to_txt(removed, "result/removed.txt")
 
-    result = list()
-    for v in vn2:
-        if v not in vn1:
-            result.append(v)
 
-    convert_to_txt(result)
+def get_vn_key(vn: list) -> tuple:
+    """returns the canonical key of a variation nucleus: the locations and label sets of both items
+    (in sorted order, so it does not matter which of them comes first) and the word pair"""
+    items = sorted((item.sentence, item.word1, item.word2, tuple(sorted(item.label or ()))) for item in vn[:2])
+    return items[0], items[1], vn[2], vn[3]
+
+
+def get_label_pair(vn: list) -> tuple:
+    """returns the undirected labels of a variation nucleus as a sorted pair"""
+    label1 = get_label_name(vn[0], True)
+    label2 = get_label_name(vn[1], True)
+    return (label1, label2) if label1 <= label2 else (label2, label1)
 
 
-def convert_to_txt(vn: list = None):
-    """converts a json file to a txt lists, creates URLs for Tündra lookup"""
+def diff_results(version1: str, version2: str):
+    """compares two result files by the keys of their variation nuclei, the files are streamed (see iter_vn())
+    returns the added and the removed variation nuclei, and the numbers of the added, removed and unchanged
+    variation nuclei per label pair"""
+    counts = {'added': Counter(), 'removed': Counter(), 'unchanged': Counter()}
+
+    remaining = Counter(get_vn_key(vn) for vn in iter_vn(version1))
+    added = list()
+    for vn in iter_vn(version2):
+        key = get_vn_key(vn)
+        if remaining[key] > 0:
+            remaining[key] -= 1
+            counts['unchanged'][get_label_pair(vn)] += 1
+        else:
+            added.append(vn)
+            counts['added'][get_label_pair(vn)] += 1
+
+    # the keys left over belong to removed variation nuclei, the first file is read again to retrieve them
+    removed = list()
+    if +remaining:
+        for vn in iter_vn(version1):
+            key = get_vn_key(vn)
+            if remaining[key] > 0:
+                remaining[key] -= 1
+                removed.append(vn)
+                counts['removed'][get_label_pair(vn)] += 1
+    return added, removed, counts
+
+
+def convert_to_txt(vn: list = None, out: str = "result/no-repetition.txt", treebank=None):
+    """converts a json file to a txt lists, creates URLs for Tündra lookup
+    with the treebank (files like ErrorDetector.read_data() takes them), the sentences of both items follow
+    with the words of the nucleus in brackets, they are read through a SentenceIndex instead of loading the corpus"""
 
     if not vn:
         print("Get own VNs")
@@ -88,8 +221,7 @@ def convert_to_txt(vn: list = None):
         vn = read_vn(fn)
         print(len(vn))
 
-    out = "result/no-repetition.txt"
-
+    index = SentenceIndex(treebank) if treebank else None
     with open(out, "w") as f:
         for i in range(len(vn)):
             v = vn[i]
@@ -108,84 +240,101 @@ def convert_to_txt(vn: list = None):
             f.write(word1 + " - " + word2 + "\n")
             f.write(url1 + "\n")
             f.write(url2 + "\n")
+            if index:
+                f.write(index.highlight(item1) + "\n")
+                f.write(index.highlight(item2) + "\n")
             f.write("\n")
+    if index:
+        index.close()
+
+
+class Statistics:
+    """the counters of all statistics of a file of variation nuclei, computed in a single pass over the file"""
+
+    def __init__(self, filename: str):
+        self.count = 0
+        self.sentences = Counter()
+        self.variation_nuclei = Counter()
+        self.labels = Counter()
+        self.label_pairs = Counter()
+
+        # the label pairs are counted regardless of their order, under the order in which they occurred first
+        self.label_pair_keys = dict()
+
+        for vn in iter_vn(filename):
+            self.add(vn)
+
+    def add(self, vn: list):
+        item1, item2, word1, word2 = vn
+        self.count += 1
+        self.sentences[item1.sentence + 1] += 1
+        self.sentences[item2.sentence + 1] += 1
+
+        for item in (item1, item2):
+            self.variation_nuclei[';'.join((str(item.sentence + 1), str(item.word1), str(item.word2),
+                                            get_label_name(item), word1, word2))] += 1
+
+        label1 = get_label_name(item1, True)
+        label2 = get_label_name(item2, True)
+        self.labels[label1] += 1
+        self.labels[label2] += 1
+
+        canonical = (label1, label2) if label1 <= label2 else (label2, label1)
+        pair = self.label_pair_keys.get(canonical)
+        if pair is None:
+            pair = self.label_pair_keys[canonical] = (label1, label2)
+        self.label_pairs[pair] += 1
+
+
+# the statistics per file, they are computed again when the file changes
+_statistics = dict()
+
+
+def get_statistics(filename: str) -> Statistics:
+    """returns the (cached) statistics of a file of variation nuclei"""
+    status = os.stat(filename)
+    key = (os.path.abspath(filename), status.st_mtime_ns, status.st_size)
+    if key not in _statistics:
+        _statistics[key] = Statistics(filename)
+    return _statistics[key]
+
+
+def get_label_name(item: Item, undirected: bool = False) -> str:
+    """returns the label of an item as string, overlapping labels are sorted and joined
+    undirected strips the direction (-L/-R) off the labels"""
+    if item.is_nil():
+        return "NIL"
+    labels = sorted(item.label)
+    if undirected:
+        labels = [label[:-2] for label in labels]
+    return ', '.join(labels)
 
 
 def get_sentence_ids(filename: str):
     """returns the set of sentence ids (no duplicates)"""
-    vn = read_vn(filename)
-    print(len(vn))
-    sentences = set()
-    for v in vn:
-        sentences.add(v[0].sentence + 1)
-        sentences.add(v[1].sentence + 1)
-    return sentences
+    statistics = get_statistics(filename)
+    print(statistics.count)
+    return set(statistics.sentences)
 
 
 def get_label_pair_statistics(filename: str):
     """returns the counts for the label pairs"""
-    vn = read_vn(filename)
-    pairs = list()
-    for v in vn:
-        label1 = v[0].get_label_str()
-        label2 = v[1].get_label_str()
-        label1 = label1[:-2]
-        if label2 != "NIL":
-            label2 = label2[:-2]
-
-        # this allows me to ignore the vice-versa versions
-        if (label2, label1) in pairs:
-            pairs.append((label2, label1))
-        else:
-            pairs.append((label1, label2))
-
-    counter = Counter(pairs)
-    return counter.most_common()
+    return get_statistics(filename).label_pairs.most_common()
 
 
 def get_label_statistics(filename: str):
     """returns the counts for the labels themselves"""
-    vn = read_vn(filename)
-    labels = list()
-    for v in vn:
-        label1 = v[0].get_label_str()
-        label2 = v[1].get_label_str()
-        label1 = label1[:-2]
-        if label2 != "NIL":
-            label2 = label2[:-2]
-        labels.append(label1)
-        labels.append(label2)
-
-    counter = Counter(labels)
-    return counter.most_common()
+    return get_statistics(filename).labels.most_common()
 
 
 def most_frequent_sentences(filename: str):
     """returns the sentence ids that appear more than 10 times in the variation nuclei"""
-    vn = read_vn(filename)
-    sentences = list()
-    for v in vn:
-        sentences.append(v[0].sentence + 1)
-        sentences.append(v[1].sentence + 1)
-
-    counter = Counter(sentences)
-    return counter.most_common(40)
+    return get_statistics(filename).sentences.most_common(40)
 
 
 def most_frequent_vn(filename: str):
     """returns a list of all word pairs which appear more than 10 times in the variation nuclei"""
-    vn = read_vn(filename)
-    items = list()
-    for v in vn:
-        item1 = v[0]
-        item2 = v[1]
-        cur1 = (str(item1.sentence + 1) + ';' + str(item1.word1) + ';' + str(item1.word2) + ';' + item1.get_label_str())
-        cur2 = (str(item2.sentence + 1) + ';' + str(item2.word1) + ';' + str(item2.word2) + ';' + item2.get_label_str())
-        items.append(cur1 + ';' + v[2] + ';' + v[3])
-        items.append(cur2 + ';' + v[2] + ';' + v[3])
-
-    counter = Counter(items)
-    return counter.most_common(20)
+    return get_statistics(filename).variation_nuclei.most_common(20)
 
 
 def create_plots(filenames: list):
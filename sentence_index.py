@@ -0,0 +1,132 @@
+import mmap
+import os
+
+import numpy as np
+
+from corpus import INDEX_SUFFIX, classify_lines, find_treebanks, get_opener, iter_blocks, open_treebank
+
+
+def build_index(filename: str) -> np.ndarray:
+    """returns the byte offset and length of every sentence of a treebank file as an array of shape (sentences, 2)
+    the sentences are the ones of Corpus.read_conllu(): every blank line ends one, and the lines after the last
+    blank line form one if they hold a token; the offsets of compressed files refer to the decompressed bytes"""
+    starts = list()
+    ends = list()
+    start = 0
+    position = 0
+    open_sentence = False
+    with open_treebank(filename) as f:
+        for block in iter_blocks(f):
+            line_starts, line_ends, blank, token = classify_lines(block)
+            blanks = np.flatnonzero(blank)
+            if len(blanks):
+                # a sentence ends before every blank line, the next one begins after it
+                ends.append(position + line_starts[blanks])
+                starts.append(np.concatenate(([start], position + line_ends[blanks[:-1]] + 1)))
+                start = position + int(line_ends[blanks[-1]]) + 1
+                open_sentence = False
+                token[:blanks[-1]] = False
+
+            # multiword tokens and empty nodes alone do not open a sentence
+            for i in np.flatnonzero(token).tolist():
+                word_id = block[line_starts[i]:line_ends[i]].split(b'\t', 1)[0]
+                if b'-' not in word_id and b'.' not in word_id:
+                    open_sentence = True
+                    break
+            position += len(block)
+    if open_sentence:
+        starts.append([start])
+        ends.append([position])
+
+    if not starts:
+        return np.zeros((0, 2), dtype=np.int64)
+    starts = np.concatenate(starts).astype(np.int64)
+    return np.stack((starts, np.concatenate(ends) - starts), axis=1)
+
+
+def load_index(filename: str) -> np.ndarray:
+    """returns the memory-mapped index of a treebank file, the index file is (re)built if it is older than the file
+    (or kept in memory if it cannot be written next to it)"""
+    path = filename + INDEX_SUFFIX
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(filename):
+        index = build_index(filename)
+        try:
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, index)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            return index
+    return np.load(path, mmap_mode='r')
+
+
+class SentenceIndex:
+    """random access to the sentences of treebank files by the sentence ids of ErrorDetector.read_data(),
+    without reading the corpus: a sentence is looked up in the index of its file and read from a memory map
+    of the file (compressed files are decompressed up to the sentence instead)"""
+
+    def __init__(self, source):
+        self.filenames = find_treebanks(source)
+        self.indices = [load_index(filename) for filename in self.filenames]
+        # the id of the first sentence of every file
+        self.first = np.cumsum([0] + [len(index) for index in self.indices])
+        self.files = dict()
+
+    def __len__(self):
+        return int(self.first[-1])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+
+    def get_bytes(self, sentence_id: int) -> bytes:
+        """returns the lines of a sentence (including its comments) as they are stored in the file"""
+        if not 0 <= sentence_id < len(self):
+            raise IndexError("sentence {} is not in the treebank".format(sentence_id))
+        number = int(np.searchsorted(self.first, sentence_id, side='right')) - 1
+        offset, length = self.indices[number][sentence_id - self.first[number]].tolist()
+        f = self.files.get(number)
+        if f is None:
+            f = self.files[number] = self.open(self.filenames[number])
+        if isinstance(f, mmap.mmap):
+            return f[offset:offset + length]
+        f.seek(offset)
+        return f.read(length)
+
+    @staticmethod
+    def open(filename: str):
+        """memory-maps an uncompressed file, opens a compressed one"""
+        if get_opener(filename) is not open:
+            return open_treebank(filename)
+        with open(filename, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get_lines(self, sentence_id: int) -> list:
+        return self.get_bytes(sentence_id).decode('utf8').splitlines()
+
+    def get_tokens(self, sentence_id: int) -> list:
+        """returns the columns of the tokens of a sentence, the (1-based) word ids of the items index this list
+        comments, multiword tokens and empty nodes are skipped like Corpus.read_conllu() does"""
+        tokens = list()
+        for line in self.get_lines(sentence_id):
+            if not line or line.startswith('#'):
+                continue
+            columns = line.split('\t')
+            if '-' not in columns[0] and '.' not in columns[0]:
+                tokens.append(columns)
+        return tokens
+
+    def highlight(self, item, marks: tuple = ('[', ']')) -> str:
+        """returns the word forms of the sentence of an item with word1 and word2 enclosed in marks
+        (the artificial root, word id 0, is not part of the sentence)"""
+        forms = [columns[1] for columns in self.get_tokens(item.sentence)]
+        for word_id in {item.word1, item.word2}:
+            if 0 < word_id <= len(forms):
+                forms[word_id - 1] = marks[0] + forms[word_id - 1] + marks[1]
+        return ' '.join(forms)
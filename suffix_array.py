@@ -0,0 +1,126 @@
+import numpy as np
+
+from corpus import Corpus
+
+
+class SuffixArray:
+    """suffix array of a sequence of integers with its LCP array and a sparse table for range minimum queries
+    the sequence has to end with a value that occurs nowhere else, like the sentinels of ContextIndex"""
+
+    def __init__(self, tokens: np.ndarray):
+        self.tokens = tokens
+        self.suffixes = self.build_suffix_array(tokens)
+        self.rank = np.empty(len(tokens), dtype=np.int64)
+        self.rank[self.suffixes] = np.arange(len(tokens))
+        lcp = self.build_lcp_array(tokens, self.suffixes)
+
+        # table[k][i] is the minimum of lcp[i:i + 2 ** k]
+        self.table = [lcp.astype(np.min_scalar_type(int(lcp.max()) if len(lcp) else 0))]
+        width = 1
+        while 2 * width <= len(lcp):
+            previous = self.table[-1]
+            self.table.append(np.minimum(previous[:-width], previous[width:]))
+            width *= 2
+
+    @staticmethod
+    def build_suffix_array(tokens: np.ndarray) -> np.ndarray:
+        """sorts the suffixes by prefix doubling, every round sorts them by the ranks of their first 2k tokens
+        the number of rounds is logarithmic in the longest repeated part of the sequence"""
+        n = len(tokens)
+        rank = np.unique(tokens, return_inverse=True)[1].astype(np.int64)
+        suffixes = np.argsort(rank, kind='stable')
+        k = 1
+        while n and rank[suffixes[-1]] < n - 1:
+            # the suffixes shorter than k come first among the ones with the same first k tokens
+            second = np.full(n, -1, dtype=np.int64)
+            second[:n - k] = rank[k:]
+            suffixes = np.lexsort((second, rank))
+            changed = np.empty(n, dtype=np.int64)
+            changed[0] = 0
+            changed[1:] = (rank[suffixes[1:]] != rank[suffixes[:-1]]) | (second[suffixes[1:]] != second[suffixes[:-1]])
+            rank[suffixes] = np.cumsum(changed)
+            k *= 2
+        return suffixes
+
+    @staticmethod
+    def build_lcp_array(tokens: np.ndarray, suffixes: np.ndarray) -> np.ndarray:
+        """returns the lengths of the longest common prefixes of the neighbouring suffixes in the suffix array
+        the pairs are compared token by token, all of them at once, until they all differ (at the latest at the
+        unique last value), so the number of rounds is the length of the longest repeated part of the sequence"""
+        first, second = suffixes[:-1], suffixes[1:]
+        lcp = np.zeros(len(first), dtype=np.int64)
+        active = np.arange(len(first))
+        k = 0
+        while len(active):
+            active = active[tokens[first[active] + k] == tokens[second[active] + k]]
+            lcp[active] += 1
+            k += 1
+        return lcp
+
+    def range_minimum(self, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        """returns the minimum of lcp[start:end] for every pair of start < end"""
+        # the largest k with 2 ** k <= end - start
+        level = np.frexp((end - start).astype(np.float64))[1] - 1
+        result = np.empty(len(start), dtype=np.int64)
+        for k in np.unique(level).tolist():
+            selected = level == k
+            table = self.table[k]
+            result[selected] = np.minimum(table[start[selected]], table[end[selected] - (1 << k)])
+        return result
+
+    def common_prefix(self, groups: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        """returns the length of the longest prefix shared by all suffixes of a group for every group,
+        the groups are the slices of the positions between the starts (like np.minimum.reduceat() takes them)
+        the suffixes of a group share the prefixes of the ones with the lowest and the highest rank
+        a group of equal positions (or of a single one) gets the largest int64"""
+        ranks = self.rank[groups]
+        lowest = np.minimum.reduceat(ranks, starts)
+        highest = np.maximum.reduceat(ranks, starts)
+        result = np.full(len(starts), np.iinfo(np.int64).max, dtype=np.int64)
+        different = lowest < highest
+        result[different] = self.range_minimum(lowest[different], highest[different])
+        return result
+
+
+class ContextIndex:
+    """finds the longest contexts the instances of variation nuclei share to their left and to their right
+    the word forms of the corpus are indexed as one sequence in which every sentence is followed by a unique
+    sentinel, so no shared context ever crosses a sentence boundary, once in reading order (right contexts)
+    and once reversed (left contexts)"""
+
+    def __init__(self, corpus: Corpus):
+        self.corpus = corpus
+        offsets = corpus.offsets
+        lengths = np.diff(offsets)
+
+        # sentinel, sentence 0, sentinel, sentence 1, ..., sentinel
+        # the sentinels are negative, the word forms are not
+        tokens = -1 - np.arange(len(corpus.form) + len(lengths) + 1, dtype=np.int64)
+        self.starts = offsets[:-1] + np.arange(1, len(lengths) + 1)
+        tokens[np.arange(len(corpus.form)) + np.repeat(np.arange(1, len(lengths) + 1), lengths)] = corpus.form
+        self.lengths = lengths
+        self.right = SuffixArray(tokens)
+        self.left = SuffixArray(tokens[::-1].copy())
+
+    def shared_contexts(self, items: list, starts: list = None) -> tuple:
+        """returns the lengths of the longest left and right contexts shared by all instances of each group
+        as two arrays, the context of a pair is the one of the tokens before word1 and after word2
+        items is a flat list of the items of all groups, starts holds the index of the first item of every group
+        (by default, the items form pairs)"""
+        if starts is None:
+            starts = np.arange(0, len(items), 2)
+        starts = np.asarray(starts, dtype=np.int64)
+        if not len(starts):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        locations = np.array([(item.sentence, item.word1, item.word2) for item in items], dtype=np.int64)
+        sentence, word1, word2 = locations.T
+        first = self.starts[sentence]
+
+        # the right context starts after word2, the left one ends before word1 (word1 is 0 for the root)
+        right = self.right.common_prefix(first + word2, starts)
+        left = self.left.common_prefix(len(self.left.tokens) - first - np.maximum(word1, 1) + 1, starts)
+
+        # no context reaches beyond the sentence, the artificial root has no left context
+        right = np.minimum(right, np.minimum.reduceat(self.lengths[sentence] - word2, starts))
+        left = np.minimum(left, np.minimum.reduceat(np.maximum(word1 - 1, 0), starts))
+        return left, right
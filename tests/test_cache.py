@@ -0,0 +1,74 @@
+from treebanks import run, unfiltered, vn_keys, write_treebank
+
+import glob
+import os
+
+from error_detection import Configuration
+
+NUM_SENTENCES = 300
+
+
+def run_cached(monkeypatch, tmp_path, capsys, treebank: str, config: Configuration = None, **settings):
+    """runs detect_errors() with the cache, returns the detector and the phase it was resumed from"""
+    detector = run(monkeypatch, tmp_path, treebank, config, USE_CACHE=True, CACHE_DIR=str(tmp_path / 'cache'),
+                   **settings)
+    out = capsys.readouterr().out
+    loaded = [line.split()[2] for line in out.splitlines() if line.startswith("Loaded the ")]
+    return detector, loaded[0] if loaded else None
+
+
+def assert_same_result(detector, reference):
+    assert detector.nuclei_count == reference.nuclei_count
+    assert detector.raw_count == reference.raw_count
+    assert detector.nuclei == reference.nuclei
+    assert detector.nil == reference.nil
+    assert vn_keys(detector.variation_nuclei) == vn_keys(reference.variation_nuclei)
+    assert detector.metrics.counts == reference.metrics.counts
+
+
+def test_resume_from_nuclei(tmp_path, monkeypatch, capsys):
+    treebank = write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES)
+    reference = run(monkeypatch, tmp_path, treebank, unfiltered())
+
+    _, phase = run_cached(monkeypatch, tmp_path, capsys, treebank, unfiltered())
+    assert phase is None
+    detector, phase = run_cached(monkeypatch, tmp_path, capsys, treebank, unfiltered())
+    assert phase == 'raw'
+    assert_same_result(detector, reference)
+
+    raw, = glob.glob(str(tmp_path / 'cache' / '*.raw.pickle'))
+    os.remove(raw)
+    detector, phase = run_cached(monkeypatch, tmp_path, capsys, treebank, unfiltered())
+    assert phase == 'nuclei'
+    assert_same_result(detector, reference)
+
+
+def test_settings_invalidate_snapshots(tmp_path, monkeypatch, capsys):
+    treebank = write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES)
+    run_cached(monkeypatch, tmp_path, capsys, treebank)
+
+    # the streaming mode filters the raw variation nuclei while they are produced, only the corpus is reused
+    for config in (None, Configuration(non_fringe=False)):
+        reference = run(monkeypatch, tmp_path, treebank, config, STREAMING=True)
+        detector, phase = run_cached(monkeypatch, tmp_path, capsys, treebank, config, STREAMING=True)
+        assert phase == 'corpus'
+        assert vn_keys(detector.variation_nuclei) == vn_keys(reference.variation_nuclei)
+
+    # the hash join only forms the pairs which pass the heuristics, a heuristic flag changes the snapshots
+    configurations = (Configuration(non_fringe=False), Configuration(nil_internal_context=False))
+    for config in configurations:
+        _, phase = run_cached(monkeypatch, tmp_path, capsys, treebank, config, HASH_JOIN=True)
+        assert phase == 'corpus'
+    for config in configurations:
+        reference = run(monkeypatch, tmp_path, treebank, config, HASH_JOIN=True)
+        assert reference.variation_nuclei
+        detector, phase = run_cached(monkeypatch, tmp_path, capsys, treebank, config, HASH_JOIN=True)
+        assert phase == 'raw'
+        assert vn_keys(detector.variation_nuclei) == vn_keys(reference.variation_nuclei)
+
+    # NO_REPETITION is applied after the snapshots
+    config = Configuration(non_fringe=False, no_repetition=True)
+    reference = run(monkeypatch, tmp_path, treebank, config, HASH_JOIN=True)
+    detector, phase = run_cached(monkeypatch, tmp_path, capsys, treebank, config, HASH_JOIN=True)
+    assert phase == 'raw'
+    assert vn_keys(detector.variation_nuclei) == vn_keys(reference.variation_nuclei)
@@ -0,0 +1,37 @@
+from treebanks import Configuration, run, vn_keys, write_treebank
+
+from post_processing import read_groups, read_vn
+
+NUM_SENTENCES = 300
+
+# accepts a few thousand variation nuclei of the synthetic treebank, overlaps included
+CONFIG = Configuration(non_fringe=False, nil_internal_context=False)
+
+
+def read_keys(filename: str) -> list:
+    """the variation nuclei of a result file by the keys of their items, with the word forms"""
+    variation_nuclei = read_vn(filename)
+    return [key + tuple(vn[2:]) for key, vn in zip(vn_keys(vn[:2] for vn in variation_nuclei), variation_nuclei)]
+
+
+def test_groups_expand_to_variation_nuclei(tmp_path, monkeypatch):
+    treebank = write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES)
+    filename = str(tmp_path / 'variationNuclei.json')
+    run(monkeypatch, tmp_path, treebank, CONFIG, OUTPUT_FILE=filename)
+    expected = read_keys(filename)
+    assert expected
+
+    for settings in ({}, {'EXTEND_CONTEXTS': True, 'SORT_BY_CONTEXT': True}):
+        grouped = str(tmp_path / 'grouped.json')
+        run(monkeypatch, tmp_path, treebank, CONFIG, OUTPUT_FILE=grouped, GROUPED_OUTPUT=True, **settings)
+        variation_nuclei = read_keys(grouped)
+        assert len(variation_nuclei) == len(expected)
+        assert set(variation_nuclei) == set(expected)
+
+        # one record per word pair, which holds every instance once
+        groups = read_groups(grouped)
+        assert len({(word1, word2) for word1, word2, _, _ in groups}) == len(groups)
+        for word1, word2, instances, pairs in groups:
+            items = [item for label_items in instances.values() for item in label_items]
+            assert len(set(items)) == len(items)
+            assert {i for pair in pairs for i in pair} == set(range(len(items)))
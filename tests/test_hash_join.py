@@ -0,0 +1,31 @@
+from treebanks import run, unfiltered, vn_keys, write_treebank
+
+from error_detection import Configuration
+
+NUM_SENTENCES = 300
+
+# each configuration accepts some of the variation nuclei of the synthetic treebank
+CONFIGURATIONS = [Configuration(non_fringe=False),
+                  Configuration(nil_internal_context=False),
+                  Configuration(dependency_context=False, pos_filter='DET'),
+                  Configuration(non_fringe=False, nil_internal_context=False, no_repetition=True),
+                  unfiltered()]
+
+
+def test_hash_join_matches_pairwise_filtering(tmp_path, monkeypatch):
+    treebank = write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES)
+    for config in CONFIGURATIONS:
+        reference = run(monkeypatch, tmp_path, treebank, config)
+        joined = run(monkeypatch, tmp_path, treebank, config, HASH_JOIN=True)
+        assert reference.variation_nuclei
+        assert joined.raw_count == reference.raw_count
+        assert vn_keys(joined.variation_nuclei) == vn_keys(reference.variation_nuclei)
+
+
+def test_hash_join_in_shards(tmp_path, monkeypatch):
+    treebank = write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES)
+    config = CONFIGURATIONS[1]
+    reference = run(monkeypatch, tmp_path, treebank, config)
+    joined = run(monkeypatch, tmp_path, treebank, config, HASH_JOIN=True, NUM_WORKERS=2)
+    assert joined.raw_count == reference.raw_count
+    assert vn_keys(joined.variation_nuclei) == vn_keys(reference.variation_nuclei)
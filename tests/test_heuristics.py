@@ -0,0 +1,99 @@
+from treebanks import run, unfiltered, write_treebank
+
+import numpy as np
+
+from error_detection import Configuration, ErrorDetector, HEURISTICS
+from trie import Item
+
+NUM_SENTENCES = 300
+
+CONFIGURATIONS = [Configuration(),
+                  Configuration(non_fringe=False),
+                  Configuration(nil_internal_context=False, pos_filter='DET'),
+                  Configuration(dependency_context=False, pos_filter='NOUN')]
+
+
+def get_surrounding_reference(detector: ErrorDetector, item: Item) -> list:
+    """the previous ErrorDetector.get_surrounding(), which reads the surrounding words from the corpus"""
+    corpus = detector.corpus
+    form, upos, punct = corpus.form_view, corpus.upos_view, corpus.punct
+    sentence_id = item.sentence
+    length = corpus.offsets_view[sentence_id + 1] - corpus.offsets_view[sentence_id]
+    l1, r1, l2, r2 = -1, -1, -1, -1
+
+    if item.word1 > 1:
+        l1_item = corpus.index(sentence_id, item.word1 - 2)
+        if upos[l1_item] == punct:
+            if item.word1 > 2:
+                l1_item = corpus.index(sentence_id, item.word1 - 3)
+                l1 = form[l1_item] if upos[l1_item] != punct else -1
+        else:
+            l1 = form[l1_item]
+
+    r1_item = corpus.index(sentence_id, item.word1)
+    if upos[r1_item] == punct:
+        r1_item = corpus.index(sentence_id, item.word1 + 1)
+    r1 = form[r1_item]
+
+    l2_item = corpus.index(sentence_id, item.word2 - 2)
+    if upos[l2_item] == punct:
+        l2_item = corpus.index(sentence_id, item.word2 - 3)
+    l2 = form[l2_item]
+
+    if item.word2 < length:
+        r2_item = corpus.index(sentence_id, item.word2)
+        if upos[r2_item] == punct:
+            if item.word2 < length - 1:
+                r2_item = corpus.index(sentence_id, item.word2 + 1)
+                r2 = form[r2_item] if upos[r2_item] != punct else -1
+        else:
+            r2 = form[r2_item]
+
+    return [l1, r1, l2, r2]
+
+
+def accept_reference(detector: ErrorDetector, item1: Item, item2: Item, rejections: dict) -> bool:
+    """the previous check of a single raw variation nucleus (without NO_REPETITION)"""
+    config = detector.config
+    rejected = None
+    if not item2.is_nil():
+        if config.non_fringe and (get_surrounding_reference(detector, item1) !=
+                                  get_surrounding_reference(detector, item2)):
+            rejected = 'non_fringe'
+    elif config.nil_internal_context and not detector.apply_nil_internal_context_heuristics(item1, item2):
+        rejected = 'nil_internal_context'
+
+    if rejected is None:
+        if config.dependency_context and not detector.apply_dependency_context_heuristic(item1, item2):
+            rejected = 'dependency_context'
+        elif config.pos and not detector.apply_pos_heuristic(item1, item2):
+            rejected = 'pos'
+        else:
+            return True
+    rejections[rejected] += 1
+    return False
+
+
+def test_surroundings_match_corpus(tmp_path, monkeypatch):
+    detector = run(monkeypatch, tmp_path, write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES), unfiltered())
+    items = detector.variation_nuclei_raw.items
+    expected = [get_surrounding_reference(detector, item) for item in items]
+    assert [detector.get_surrounding(item) for item in items] == expected
+    locations = np.array([(item.sentence, item.word1, item.word2) for item in items])
+    assert detector.get_neighbours().surroundings(*locations.T).tolist() == expected
+
+
+def test_batch_masks_match_single_checks(tmp_path, monkeypatch):
+    detector = run(monkeypatch, tmp_path, write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES), unfiltered())
+    raw = detector.variation_nuclei_raw
+    total = 0
+    for config in CONFIGURATIONS:
+        detector.config = config
+        expected, rejections = dict.fromkeys(HEURISTICS, 0), dict.fromkeys(HEURISTICS, 0)
+        accepted = [accept_reference(detector, item1, item2, expected) for item1, item2 in raw]
+        total += sum(accepted)
+
+        detector.rejections = rejections
+        assert detector.check_batch(list(raw)).tolist() == accepted
+        assert rejections == expected
+    assert total > 0
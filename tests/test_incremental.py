@@ -0,0 +1,55 @@
+from treebanks import ErrorDetector, run, unfiltered, vn_keys, write_treebank
+
+import pytest
+
+import error_detection
+
+NUM_SENTENCES = 300
+NUM_NEW_SENTENCES = 60
+
+
+def test_add_sentences_matches_full_run(tmp_path, monkeypatch):
+    old = write_treebank(tmp_path / 'old.conllu', NUM_SENTENCES, 1)
+    new = write_treebank(tmp_path / 'new.conllu', NUM_NEW_SENTENCES, 2)
+    for config in (None, unfiltered()):
+        full = run(monkeypatch, tmp_path, [old, new], config)
+        detector = run(monkeypatch, tmp_path, old, config)
+        monkeypatch.setattr(error_detection, 'PROGRESS', 'none')
+        detector.add_sentences(new)
+        assert detector.raw_count == full.raw_count
+        assert set(vn_keys(detector.variation_nuclei)) == set(vn_keys(full.variation_nuclei))
+
+
+def test_add_sentences_after_cache_resume(tmp_path, monkeypatch, capsys):
+    old = write_treebank(tmp_path / 'old.conllu', NUM_SENTENCES, 1)
+    new = write_treebank(tmp_path / 'new.conllu', NUM_NEW_SENTENCES, 2)
+
+    full = run(monkeypatch, tmp_path, [old, new], unfiltered())
+    assert full.variation_nuclei
+
+    # the second run resumes from the snapshot of the raw variation nuclei
+    for _ in range(2):
+        detector = run(monkeypatch, tmp_path, old, unfiltered(), USE_CACHE=True, CACHE_DIR=str(tmp_path / 'cache'))
+    assert "Loaded the raw phase" in capsys.readouterr().out
+    assert detector.nil.count() > 0
+    detector.save_state(str(tmp_path / 'state.pickle'))
+
+    monkeypatch.setattr(error_detection, 'PROGRESS', 'none')
+    incremental = ErrorDetector(unfiltered())
+    incremental.load_state(str(tmp_path / 'state.pickle'))
+    new_variation_nuclei = incremental.add_sentences(new)
+    assert len(new_variation_nuclei) == len(full.variation_nuclei) - len(detector.variation_nuclei)
+    # apart from their order, the variation nuclei are the ones of the full run
+    assert set(vn_keys(incremental.variation_nuclei)) == set(vn_keys(full.variation_nuclei))
+
+
+def test_load_state_rejects_other_settings(tmp_path, monkeypatch):
+    old = write_treebank(tmp_path / 'old.conllu', NUM_SENTENCES, 1)
+    monkeypatch.setattr(error_detection, 'DEMAND_DRIVEN_NIL', True)
+    detector = run(monkeypatch, tmp_path, old)
+    detector.save_state(str(tmp_path / 'state.pickle'))
+
+    # the NIL items of the state are incomplete
+    monkeypatch.setattr(error_detection, 'DEMAND_DRIVEN_NIL', False)
+    with pytest.raises(ValueError):
+        ErrorDetector().load_state(str(tmp_path / 'state.pickle'))
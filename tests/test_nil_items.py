@@ -0,0 +1,96 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from corpus import Sentence
+from error_detection import ErrorDetector
+from trie import NilTrie
+
+# the word forms and tags are drawn from small ranges, so that type-identical tokens are frequent
+NUM_SENTENCES = 2000
+MAX_LENGTH = 30
+NUM_FORMS = 6
+
+
+def collect_nil_items_reference(nil: NilTrie, sentence: Sentence, word_id: int, sentence_id: int, punct: int):
+    """the previous overlap check, which scans the sentence for type-identical dependencies of every word pair"""
+    forms, heads = sentence.forms, sentence.heads
+    word = forms[word_id - 1]
+    head_id = heads[word_id - 1]
+    for i in range(word_id, len(sentence)):
+        if sentence.upos[i] == punct:
+            continue
+        other_word = forms[i]
+        other_word_id = i + 1
+        other_head_id = heads[i]
+        overlap = False
+        for j in range(word_id, len(sentence)):
+            if forms[j] == other_word:
+                if heads[j] == word_id or head_id == j + 1:
+                    overlap = True
+                    break
+        for j in range(0, other_word_id - 1):
+            if forms[j] == word:
+                if heads[j] == other_word_id or other_head_id == j + 1:
+                    overlap = True
+                    break
+        if not overlap:
+            nil.add_item(word, other_word, sentence_id, word_id, other_word_id)
+
+
+def random_sentence(rng: random.Random, punct: int) -> Sentence:
+    """returns a sentence with random heads, including self-loops, heads on punctuation tokens
+    and dependencies between the first and the last token"""
+    length = rng.randint(1, MAX_LENGTH)
+    forms = [rng.randrange(NUM_FORMS) for _ in range(length)]
+    upos = [punct if rng.random() < 0.2 else punct + 1 for _ in range(length)]
+    heads = [rng.randint(0, length) for _ in range(length)]
+    punct_ids = [i + 1 for i in range(length) if upos[i] == punct]
+    for i in range(length):
+        choice = rng.random()
+        if choice < 0.1:
+            heads[i] = i + 1
+        elif choice < 0.2 and punct_ids:
+            heads[i] = rng.choice(punct_ids)
+        elif choice < 0.3:
+            heads[i] = rng.choice((1, length))
+    return Sentence(forms, upos, heads, [0] * length)
+
+
+def build_tries(seed: int):
+    rng = random.Random(seed)
+    detector = ErrorDetector()
+    punct = detector.corpus.punct
+    reference = NilTrie()
+    for sentence_id in range(NUM_SENTENCES):
+        sentence = random_sentence(rng, punct)
+        for word_id in range(1, len(sentence) + 1):
+            if sentence.upos[word_id - 1] == punct:
+                continue
+            collect_nil_items_reference(reference, sentence, word_id, sentence_id, punct)
+            detector.collect_nil_items(sentence, word_id, sentence_id)
+    return reference, detector.nil
+
+
+def test_nil_items_match_overlap_scan():
+    for seed in range(5):
+        reference, nil = build_tries(seed)
+        assert reference.count() > 0
+        assert nil == reference
+        # the items of every word pair are also stored in the same order
+        for word1, level2 in reference.items():
+            assert list(nil[word1]) == list(level2)
+
+
+def test_first_and_last_token():
+    detector = ErrorDetector()
+    punct = detector.corpus.punct
+    # the last token is the head of the first one, and both have the same forms as the tokens in between
+    sentence = Sentence([0, 1, 0, 1], [punct + 1] * 4, [4, 1, 2, 0], [0] * 4)
+    reference = NilTrie()
+    for word_id in range(1, 5):
+        collect_nil_items_reference(reference, sentence, word_id, 0, punct)
+        detector.collect_nil_items(sentence, word_id, 0)
+    assert detector.nil == reference
@@ -0,0 +1,79 @@
+from treebanks import Configuration, ErrorDetector, run, vn_keys, write_treebank
+
+import numpy as np
+import pytest
+
+from output import BINARY_MAGIC, FOOTER, RECORD_SIZE
+from post_processing import get_format, iter_binary_vn, iter_vn, read_vn
+
+NUM_SENTENCES = 300
+
+# accepts a few thousand variation nuclei of the synthetic treebank
+CONFIG = Configuration(non_fringe=False, nil_internal_context=False)
+
+
+def read_keys(filename: str, reader=iter_vn) -> list:
+    """the variation nuclei of a result file by the keys of their items, with the word forms"""
+    variation_nuclei = list(reader(filename))
+    return list(zip(vn_keys(vn[:2] for vn in variation_nuclei), (tuple(vn[2:]) for vn in variation_nuclei)))
+
+
+def test_formats_match_json(tmp_path, monkeypatch):
+    treebank = write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES)
+    files = dict()
+    for file_format in ('json', 'jsonl', 'binary'):
+        files[file_format] = str(tmp_path / 'variationNuclei.{}'.format(file_format))
+        run(monkeypatch, tmp_path, treebank, CONFIG, OUTPUT_FORMAT=file_format, OUTPUT_FILE=files[file_format])
+        assert get_format(files[file_format]) == file_format
+
+    expected = read_keys(files['json'], read_vn)
+    assert expected
+    assert read_keys(files['jsonl']) == expected
+    assert read_keys(files['binary']) == expected
+    assert read_keys(files['binary'], iter_binary_vn) == expected
+
+
+def test_binary_layout(tmp_path, monkeypatch):
+    filename = str(tmp_path / 'variationNuclei.bin')
+    detector = run(monkeypatch, tmp_path, write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES), CONFIG,
+                   OUTPUT_FORMAT='binary', OUTPUT_FILE=filename)
+    with open(filename, 'rb') as f:
+        data = f.read()
+    assert data.startswith(BINARY_MAGIC)
+
+    # little-endian int32 records, then the vocab table, then the footer
+    count, offset = FOOTER.unpack(data[-FOOTER.size:])
+    assert count == len(detector.variation_nuclei)
+    assert offset == len(BINARY_MAGIC) + 4 * RECORD_SIZE * count
+    records = np.frombuffer(data[len(BINARY_MAGIC):offset], dtype='<i4').reshape(count, RECORD_SIZE)
+    assert records[:, [0, 1, 2, 4, 5, 6]].tolist() == [
+        [item1.sentence, item1.word1, item1.word2, item2.sentence, item2.word1, item2.word2]
+        for item1, item2 in detector.variation_nuclei]
+    assert (records[:, 7] == -1).tolist() == [item2.is_nil() for _, item2 in detector.variation_nuclei]
+
+
+def test_writer_closed_after_failure(tmp_path, monkeypatch):
+    treebank = write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES)
+    run(monkeypatch, tmp_path, treebank, CONFIG, OUTPUT_FORMAT='binary', OUTPUT_FILE=str(tmp_path / 'complete.bin'))
+    complete = read_keys(str(tmp_path / 'complete.bin'))
+
+    # the heuristics fail after the first batch
+    check_columns = ErrorDetector.check_columns
+    calls = []
+
+    def failing_check_columns(self, columns):
+        calls.append(len(columns))
+        if len(calls) > 1:
+            raise RuntimeError("heuristics failed")
+        return check_columns(self, columns)
+
+    monkeypatch.setattr(ErrorDetector, 'check_columns', failing_check_columns)
+    filename = str(tmp_path / 'failed.bin')
+    with pytest.raises(RuntimeError):
+        run(monkeypatch, tmp_path, treebank, CONFIG, OUTPUT_FORMAT='binary', OUTPUT_FILE=filename,
+            HEURISTICS_BATCH_SIZE=5000)
+
+    # the file is complete, with the variation nuclei accepted in the first batch
+    written = read_keys(filename)
+    assert written
+    assert written == complete[:len(written)]
@@ -0,0 +1,116 @@
+from treebanks import run, write_treebank
+
+import bz2
+import gzip
+import lzma
+
+import corpus as corpus_module
+from corpus import Corpus, get_opener, open_treebank, split_treebank
+
+# comments, a multiword token, an empty node, a line with more columns, CRLF line breaks, double blank lines
+# and no line break after the last line
+SAMPLE = ("# newdoc id = a\n"
+          "# newdoc id = b\n"
+          "# sent_id = 1\n"
+          "1\tDas\tder\tPRON\t_\t_\t3\tnsubj\t_\t_\n"
+          "2-3\tzum\t_\t_\t_\t_\t_\t_\t_\t_\n"
+          "2\tzu\tzu\tADP\t_\t_\t3\tcase\t_\t_\n"
+          "3\tdem\tder\tDET\t_\t_\t0\troot\t_\t_\n"
+          "3.1\tist\tsein\tAUX\t_\t_\t_\t_\t_\t_\n"
+          "4\t.\t.\tPUNCT\t_\t_\t3\tpunct\t_\tSpaceAfter=No\textra\tcolumns\n"
+          "\n"
+          "\n"
+          "# sent_id = 2\r\n"
+          "1\tJa\tja\tINTJ\t_\t_\t0\troot\t_\t_\r\n"
+          "2\t!\t!\tPUNCT\t_\t_\t1\tpunct\t_\t_\r\n"
+          "\r\n"
+          "# sent_id = 3\n"
+          "1\tEnde\tEnde\tNOUN\t_\t_\t0\troot\t_\t_")
+
+
+def read_lines_reference(text: str) -> Corpus:
+    """the line by line reader the bulk reader replaced, extended by the empty nodes and CRLF line breaks"""
+    corpus = Corpus()
+    lines = text.split('\n')
+    if not lines[-1]:
+        lines.pop()
+    open_sentence = False
+    for line in lines:
+        line = line[:-1] if line.endswith('\r') else line
+        if not line:
+            corpus.end_sentence()
+            open_sentence = False
+        elif not line.startswith('#'):
+            fields = line.split('\t')
+            if '-' not in fields[0] and '.' not in fields[0]:
+                corpus.add_token(fields[1], fields[3], fields[6], fields[7])
+                open_sentence = True
+    if open_sentence:
+        corpus.end_sentence()
+    corpus.finalize()
+    return corpus
+
+
+def get_columns(corpus: Corpus) -> tuple:
+    return (corpus.form.tolist(), corpus.upos.tolist(), corpus.head.tolist(), corpus.deprel.tolist(),
+            corpus.offsets.tolist(), corpus.vocab.strings, corpus.pos_tags.strings, corpus.labels.strings)
+
+
+def read_bulk(filename: str) -> Corpus:
+    corpus = Corpus()
+    with open_treebank(filename) as f:
+        corpus.read_conllu(f)
+    return corpus
+
+
+def read_chunks(filename: str, chunk_size: int) -> Corpus:
+    """reads the chunks of split_treebank() into corpora of their own and appends them, like read_data() does"""
+    corpus = Corpus()
+    for chunk in split_treebank(filename, chunk_size):
+        part = Corpus()
+        part.read_chunk(chunk)
+        corpus.extend(part)
+    return corpus
+
+
+def write_sample(path, text: str, opener=open) -> str:
+    with opener(str(path), 'wb') as f:
+        f.write(text.encode('utf8'))
+    return str(path)
+
+
+def test_sample_matches_line_reader(tmp_path, monkeypatch):
+    expected = get_columns(read_lines_reference(SAMPLE))
+    # three sentences, the double blank line closes an empty one
+    assert expected[4] == [0, 4, 4, 6, 7]
+    filename = write_sample(tmp_path / 'sample.conllu', SAMPLE)
+    for read_size in (1, 2, 7, 64, 1 << 20):
+        monkeypatch.setattr(corpus_module, 'READ_SIZE', read_size)
+        assert get_columns(read_bulk(filename)) == expected
+        for chunk_size in (1, 16, 100, 1 << 20):
+            assert get_columns(read_chunks(filename, chunk_size)) == expected
+
+
+def test_compressed_input(tmp_path):
+    expected = get_columns(read_lines_reference(SAMPLE))
+    for opener, extension in ((gzip.open, '.gz'), (lzma.open, '.xz'), (bz2.open, '.bz2')):
+        filename = write_sample(tmp_path / ('sample.conllu' + extension), SAMPLE, opener)
+        assert get_opener(filename) is opener
+        # compressed files are not split
+        assert split_treebank(filename, 1) == [(filename, 0, None)]
+        assert get_columns(read_bulk(filename)) == expected
+        assert get_columns(read_chunks(filename, 1)) == expected
+
+
+def test_treebank_matches_line_reader(tmp_path, monkeypatch):
+    filename = write_treebank(tmp_path / 'treebank.conllu', 500)
+    with open(filename, encoding='utf8') as f:
+        expected = get_columns(read_lines_reference(f.read()))
+    monkeypatch.setattr(corpus_module, 'READ_SIZE', 4096)
+    assert get_columns(read_bulk(filename)) == expected
+    for chunk_size in (10000, 1 << 20):
+        assert get_columns(read_chunks(filename, chunk_size)) == expected
+
+    # read_data() parses the chunks in parallel
+    detector = run(monkeypatch, tmp_path, filename, NUM_WORKERS=2, READ_CHUNK_SIZE=10000)
+    assert get_columns(detector.corpus) == expected
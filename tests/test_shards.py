@@ -0,0 +1,46 @@
+from treebanks import run, unfiltered, vn_keys, write_treebank
+
+from error_detection import ErrorDetector
+from trie import NilTrie, Trie
+
+NUM_SENTENCES = 300
+
+
+def assert_same_analysis(sharded, reference):
+    assert sharded.nuclei_count == reference.nuclei_count
+    assert sharded.raw_count == reference.raw_count
+    assert sharded.rejections == reference.rejections
+    assert sharded.nuclei == reference.nuclei
+    assert sharded.nil == reference.nil
+    assert vn_keys(sharded.variation_nuclei) == vn_keys(reference.variation_nuclei)
+
+
+def test_shards_match_single_process(tmp_path, monkeypatch):
+    treebank = write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES)
+    for demand_driven in (False, True):
+        for config in (None, unfiltered()):
+            reference = run(monkeypatch, tmp_path, treebank, config, DEMAND_DRIVEN_NIL=demand_driven)
+            # several shards per process, and batches small enough for the heuristics to run in parallel as well
+            sharded = run(monkeypatch, tmp_path, treebank, config, DEMAND_DRIVEN_NIL=demand_driven,
+                          NUM_WORKERS=2, SHARDS_PER_WORKER=3, HEURISTICS_BATCH_SIZE=1000)
+            assert reference.raw_count
+            assert_same_analysis(sharded, reference)
+
+
+def test_columns_match_merge(tmp_path, monkeypatch):
+    corpus = run(monkeypatch, tmp_path, write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES)).corpus
+    detector = ErrorDetector()
+    detector.corpus = corpus
+    detector.intern_labels()
+
+    # the tries of three shards, sent as arrays and merged directly
+    added, merged = (Trie(detect=False), NilTrie()), (Trie(detect=False), NilTrie())
+    for start, end in ((0, 100), (100, 101), (101, len(corpus))):
+        detector.nuclei, detector.nil = Trie(detect=False), NilTrie()
+        detector.analyze_sentence_range(start, end)
+        added[0].add_columns(*detector.nuclei.to_columns())
+        added[1].add_columns(*detector.nil.to_columns())
+        merged[0].merge(detector.nuclei)
+        merged[1].merge(detector.nil)
+    assert merged[1].count() > 0
+    assert added == merged
@@ -0,0 +1,23 @@
+from treebanks import run, unfiltered, vn_keys, write_treebank
+
+from error_detection import Configuration
+
+NUM_SENTENCES = 300
+
+# each configuration accepts some of the variation nuclei of the synthetic treebank
+CONFIGURATIONS = [Configuration(non_fringe=False),
+                  Configuration(nil_internal_context=False),
+                  Configuration(dependency_context=False, pos_filter='DET'),
+                  Configuration(non_fringe=False, nil_internal_context=False, no_repetition=True),
+                  unfiltered()]
+
+
+def test_streaming_matches_pipeline(tmp_path, monkeypatch):
+    treebank = write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES)
+    for config in CONFIGURATIONS:
+        reference = run(monkeypatch, tmp_path, treebank, config)
+        assert reference.variation_nuclei
+        for hash_join in (False, True):
+            streamed = run(monkeypatch, tmp_path, treebank, config, STREAMING=True, HASH_JOIN=hash_join)
+            assert streamed.raw_count == reference.raw_count
+            assert vn_keys(streamed.variation_nuclei) == vn_keys(reference.variation_nuclei)
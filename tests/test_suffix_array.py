@@ -0,0 +1,75 @@
+from treebanks import run, write_treebank
+
+import random
+
+import numpy as np
+
+from suffix_array import ContextIndex, SuffixArray
+from trie import Item
+
+NUM_SENTENCES = 300
+NUM_GROUPS = 3000
+
+
+def shared_contexts_reference(corpus, items: list) -> list:
+    """scans the tokens before word1 and after word2 of all items until they differ or a sentence ends"""
+    sentences = [corpus.sentence(item.sentence).forms for item in items]
+    left = 0
+    while all(item.word1 - 2 - left >= 0 for item in items) and len(
+            {forms[item.word1 - 2 - left] for item, forms in zip(items, sentences)}) == 1:
+        left += 1
+    right = 0
+    while all(item.word2 + right < len(forms) for item, forms in zip(items, sentences)) and len(
+            {forms[item.word2 + right] for item, forms in zip(items, sentences)}) == 1:
+        right += 1
+    return [left, right]
+
+
+def random_item(rng: random.Random, corpus) -> Item:
+    """an item of a random sentence, word1 is 0 (the root) now and then"""
+    while True:
+        sentence = rng.randrange(len(corpus))
+        length = corpus.offsets_view[sentence + 1] - corpus.offsets_view[sentence]
+        if length >= 2:
+            break
+    word2 = rng.randint(2, length)
+    word1 = 0 if rng.random() < 0.1 else rng.randint(1, word2 - 1)
+    return Item(sentence, word1, word2)
+
+
+def random_group(rng: random.Random, corpus) -> list:
+    """mostly pairs, some single items and larger groups; the items of a group often share their word forms"""
+    items = [random_item(rng, corpus) for _ in range(rng.choice((1, 2, 2, 2, 3, 4)))]
+    if len(items) > 1 and rng.random() < 0.5:
+        # the same location twice, its contexts reach the boundaries of the sentence
+        items[1] = Item(items[0].sentence, items[0].word1, items[0].word2)
+    return items
+
+
+def test_suffix_array_matches_sorting():
+    rng = random.Random(1)
+    for _ in range(50):
+        tokens = [rng.randrange(3) for _ in range(rng.randint(0, 40))] + [-1]
+        suffix_array = SuffixArray(np.array(tokens, dtype=np.int64))
+        assert suffix_array.suffixes.tolist() == sorted(range(len(tokens)), key=lambda i: tokens[i:])
+
+
+def test_shared_contexts_match_scan(tmp_path, monkeypatch):
+    detector = run(monkeypatch, tmp_path, write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES))
+    corpus = detector.corpus
+    rng = random.Random(1)
+    groups = [random_group(rng, corpus) for _ in range(NUM_GROUPS)]
+    expected = [shared_contexts_reference(corpus, group) for group in groups]
+    assert any(left for left, _ in expected) and any(right for _, right in expected)
+
+    index = ContextIndex(corpus)
+    starts = np.cumsum([0] + [len(group) for group in groups[:-1]])
+    left, right = index.shared_contexts([item for group in groups for item in group], starts)
+    assert np.stack((left, right), axis=1).tolist() == expected
+
+    pairs = [group for group in groups if len(group) == 2]
+    left, right = index.shared_contexts([item for pair in pairs for item in pair])
+    assert np.stack((left, right), axis=1).tolist() == [shared_contexts_reference(corpus, pair) for pair in pairs]
+
+    # the groups of the json output
+    assert detector.get_shared_contexts(groups) == expected
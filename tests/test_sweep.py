@@ -0,0 +1,34 @@
+from treebanks import run, vn_keys, write_treebank
+
+import error_detection
+from error_detection import Configuration, ErrorDetector
+from post_processing import read_vn
+
+NUM_SENTENCES = 300
+
+CONFIGURATIONS = [Configuration('default'),
+                  Configuration('fringe', non_fringe=False),
+                  Configuration('context', nil_internal_context=False),
+                  Configuration('det', dependency_context=False, pos_filter='DET'),
+                  Configuration('repetition', non_fringe=False, nil_internal_context=False, no_repetition=True),
+                  Configuration('unfiltered', non_fringe=False, nil_internal_context=False, dependency_context=False,
+                                pos=False)]
+
+
+def read_keys(filename: str) -> list:
+    return vn_keys(vn[:2] for vn in read_vn(filename))
+
+
+def test_sweep_matches_separate_runs(tmp_path, monkeypatch):
+    treebank = write_treebank(tmp_path / 'treebank.conllu', NUM_SENTENCES)
+    monkeypatch.setattr(error_detection, 'PROGRESS', 'none')
+    monkeypatch.setattr(error_detection, 'OUTPUT_FILE', str(tmp_path / 'sweep.json'))
+    counts = ErrorDetector().detect_errors(treebank, CONFIGURATIONS)
+
+    assert set(counts) == {config.name for config in CONFIGURATIONS}
+    assert any(counts.values())
+    for config in CONFIGURATIONS:
+        filename = str(tmp_path / '{}.json'.format(config.name))
+        detector = run(monkeypatch, tmp_path, treebank, config, OUTPUT_FILE=filename)
+        assert counts[config.name] == len(detector.variation_nuclei)
+        assert read_keys(str(tmp_path / 'sweep-{}.json'.format(config.name))) == read_keys(filename)
@@ -0,0 +1,104 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from trie import Trie, Item
+
+# the word forms and labels are drawn from small ranges, so that overlaps and label variations are frequent
+NUM_SENTENCES = 300
+MAX_LENGTH = 12
+NUM_FORMS = 4
+RELATIONS = ('nsubj', 'obj', 'det')
+ROOT = NUM_FORMS
+
+
+def add_item_reference(trie: dict, word1: int, word2: int, sentence_id: int, word1_id: int, word2_id: int,
+                       label: str) -> list:
+    """the previous Trie.add_item(), which compares the new item with every item of its word pair"""
+    variation_nucleus = list()
+    item = Item(sentence_id, word1_id, word2_id, label)
+    items = trie.setdefault(word1, dict()).setdefault(word2, [])
+    add_it = True
+    for other_item in items:
+        if item.overlaps_with(other_item):
+            other_item.add_label(item.label_ids)
+            add_it = False
+        elif not other_item.has_label(item.label_ids):
+            variation_nucleus.append((item, other_item))
+    if add_it:
+        items.append(item)
+    return variation_nucleus
+
+
+def random_dependencies(rng: random.Random):
+    """yields the dependency pairs of random sentences like ErrorDetector.collect_dependency_pair() adds them,
+    as (word1, word2, sentence_id, word1_id, word2_id, label)"""
+    for sentence_id in range(NUM_SENTENCES):
+        length = rng.randint(1, MAX_LENGTH)
+        forms = [rng.randrange(NUM_FORMS) for _ in range(length)]
+        for word_id in range(1, length + 1):
+            head_id = rng.randint(0, length)
+            relation = rng.choice(RELATIONS)
+            if head_id == 0:
+                yield ROOT, forms[word_id - 1], sentence_id, 0, word_id, 'root-L'
+            elif head_id > word_id:
+                yield forms[word_id - 1], forms[head_id - 1], sentence_id, word_id, head_id, relation + '-R'
+            elif head_id < word_id:
+                yield forms[head_id - 1], forms[word_id - 1], sentence_id, head_id, word_id, relation + '-L'
+
+
+def locations(variation_nuclei: list) -> list:
+    return [((item1.sentence, item1.word1, item1.word2), (item2.sentence, item2.word1, item2.word2))
+            for item1, item2 in variation_nuclei]
+
+
+def test_indexed_detection_matches_scan():
+    for seed in range(3):
+        reference, trie = dict(), Trie()
+        for dependency in random_dependencies(random.Random(seed)):
+            expected = locations(add_item_reference(reference, *dependency))
+            assert locations(trie.add_item(*dependency)) == expected
+        # the items and their labels (overlaps included)
+        assert trie == reference
+
+
+def test_recorded_detection_matches_scan():
+    for seed in range(3):
+        dependencies = list(random_dependencies(random.Random(seed)))
+        reference, expected = dict(), list()
+        for dependency in dependencies:
+            expected.extend(add_item_reference(reference, *dependency))
+
+        trie = Trie(detect=False)
+        for dependency in dependencies:
+            trie.add_item(*dependency)
+        variation_nuclei, count = trie.detect_variation_nuclei()
+        assert count == len(expected)
+        assert locations(variation_nuclei) == locations(expected)
+        assert trie == reference
+
+
+def test_added_trie_matches_scan():
+    for seed in range(3):
+        dependencies = list(random_dependencies(random.Random(seed)))
+        half = len(dependencies) // 2
+        # the later sentences start after the half
+        while half < len(dependencies) and dependencies[half][2] == dependencies[half - 1][2]:
+            half += 1
+        reference, expected = dict(), list()
+        for i, dependency in enumerate(dependencies):
+            variation_nucleus = add_item_reference(reference, *dependency)
+            if i >= half:
+                expected.extend(variation_nucleus)
+
+        trie, later = Trie(), Trie(detect=False)
+        for dependency in dependencies[:half]:
+            trie.add_item(*dependency)
+        for dependency in dependencies[half:]:
+            later.add_item(*dependency)
+        variation_nuclei, count = trie.add_trie(later)
+        assert count == len(expected)
+        assert locations(variation_nuclei) == locations(expected)
+        assert trie == reference
@@ -0,0 +1,47 @@
+"""helpers of the tests which compare a processing mode of the error detection with the default one"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import error_detection
+from benchmarks.generate_treebank import TreebankGenerator
+from error_detection import Configuration, ErrorDetector
+
+# a small vocabulary, so that the word pairs recur often
+VOCAB = 300
+
+
+def write_treebank(path, sentences: int, seed: int = 1) -> str:
+    """writes a synthetic treebank into the file and returns its name"""
+    with open(str(path), 'w', encoding='utf8') as out:
+        TreebankGenerator(vocab=VOCAB, seed=seed).write(sentences, out)
+    return str(path)
+
+
+def unfiltered() -> Configuration:
+    """no heuristics, so that a comparison covers all raw variation nuclei"""
+    return Configuration(non_fringe=False, nil_internal_context=False, dependency_context=False, pos=False)
+
+
+def run(monkeypatch, tmp_path, source, config: Configuration = None, **settings) -> ErrorDetector:
+    """runs detect_errors() without progress reports, with the given constants of error_detection changed"""
+    with monkeypatch.context() as m:
+        m.setattr(error_detection, 'PROGRESS', 'none')
+        m.setattr(error_detection, 'OUTPUT_FILE', str(tmp_path / 'variationNuclei.json'))
+        for name, value in settings.items():
+            m.setattr(error_detection, name, value)
+        detector = ErrorDetector(config)
+        detector.detect_errors(source)
+    return detector
+
+
+def item_key(item) -> tuple:
+    """the location and the labels of an item"""
+    return item.sentence, item.word1, item.word2, None if item.is_nil() else frozenset(item.iter_label_ids())
+
+
+def vn_keys(variation_nuclei) -> list:
+    """the variation nuclei by the keys of their items, in their order"""
+    return [(item_key(item1), item_key(item2)) for item1, item2 in variation_nuclei]
@@ -1,113 +1,411 @@
+from array import array
+from bisect import insort
+from heapq import merge
+from collections import defaultdict
+from itertools import accumulate, chain, compress, islice, repeat
+
+from corpus import Vocabulary
+
+
+# the labels of all items are interned here once per process
+LABELS = Vocabulary()
+
+
 class Item:
     """represents an item in CONLL-U format
-    holds the location indices and a label (except for NIL items)"""
+    holds the location indices and a label (except for NIL items)
+    the labels are stored as interned ids: a single id, or a tuple of ids for items with overlaps"""
+    __slots__ = ('sentence', 'word1', 'word2', 'label_ids', '_head')
+
     def __init__(self, sentence: int, word1: int, word2: int, label=None):
         self.sentence = sentence
         self.word1 = word1
         self.word2 = word2
-        if isinstance(label, set):
-            self.label = set()
-            for la in label:
-                self.label.add(la)
+        if isinstance(label, (set, list, tuple)):
+            ids = tuple(la if isinstance(la, int) else LABELS.add(la) for la in label)
+            if not ids:
+                self.label_ids = None
+            else:
+                self.label_ids = ids[0] if len(ids) == 1 else ids
+        elif isinstance(label, str):
+            self.label_ids = LABELS.add(label) if label else None
         else:
-            self.label = {label} if label else None
+            self.label_ids = label
+
+        # the head is determined by the (first) label
+        if self.label_ids is None:
+            self._head = None
+        else:
+            first = self.label_ids if isinstance(self.label_ids, int) else self.label_ids[0]
+            self._head = word1 if LABELS.strings[first].endswith('L') else word2
+
+    @property
+    def label(self):
+        """the set of label strings, None for NIL items"""
+        if self.label_ids is None:
+            return None
+        return {LABELS.strings[la] for la in self.iter_label_ids()}
+
+    def iter_label_ids(self):
+        """iterates over the label ids in the order they were added"""
+        if isinstance(self.label_ids, int):
+            yield self.label_ids
+        elif self.label_ids is not None:
+            yield from self.label_ids
+
+    def is_nil(self) -> bool:
+        return self.label_ids is None
+
+    def has_overlap(self) -> bool:
+        """checks whether the item holds more than one label"""
+        return isinstance(self.label_ids, tuple)
+
+    def has_label(self, label_id: int) -> bool:
+        if isinstance(self.label_ids, int):
+            return self.label_ids == label_id
+        return self.label_ids is not None and label_id in self.label_ids
+
+    def add_label(self, label_id: int):
+        """adds the label of an overlapping item"""
+        if not self.has_label(label_id):
+            if isinstance(self.label_ids, int):
+                self.label_ids = (self.label_ids, label_id)
+            else:
+                self.label_ids = self.label_ids + (label_id,)
 
     def get_label(self):
         """returns the label string if there is only one, else the set"""
-        if len(self.label) == 1:
-            (label,) = self.label
-            return label
+        if isinstance(self.label_ids, int):
+            return LABELS.strings[self.label_ids]
         else:
             return self.label
 
     def get_label_str(self):
         """extract the label string out of the class variable"""
-        if not self.label:
+        if self.label_ids is None:
             return "NIL"
-        elif len(self.label) == 1:
-            (label,) = self.label
-            return label
+        elif isinstance(self.label_ids, int):
+            return LABELS.strings[self.label_ids]
 
     def head(self):
         """returns the word which is the head of the pair"""
-        if self.label:
-
-            # this will ofc only iterate once, but its more convenient this way
-            for label in self.label:
-                if label.endswith('L'):
-                    return self.word1
-                else:
-                    return self.word2
-        return None
+        return self._head
 
     def overlaps_with(self, other) -> bool:
         """checks for a given item, whether there is an overlap"""
         if self.sentence == other.sentence:
-            if self.head() == other.head():
+            if self._head == other._head:
                 return True
             return False
         return False
 
     def to_list(self, word1: str, word2: str):
         """returns a list version of itself (for json storing purposes)"""
-        return[self.sentence, [self.word1, word1], [self.word2, word2], [la for la in self.label] if self.label else None]
+        labels = [LABELS.strings[la] for la in self.iter_label_ids()] if self.label_ids is not None else None
+        return [self.sentence, [self.word1, word1], [self.word2, word2], labels]
 
     def __str__(self):
-        if self.label:
-            label = ""
-            for la in self.label:
-                label = label + la + ", "
-            label = label[:-2]
+        if self.label_ids is not None:
+            label = ", ".join(LABELS.strings[la] for la in self.iter_label_ids())
         else:
             label = "NIL"
         return "{} - {} - {} : {}".format(self.sentence + 1, self.word1, self.word2, label)
 
     def __eq__(self, other):
-        return (self.sentence == other.sentence and
-                self.word1 == other.word1 and
-                self.word2 == other.word2 and
-                self.label == other.label)
+        if (self.sentence != other.sentence or
+                self.word1 != other.word1 or
+                self.word2 != other.word2):
+            return False
+        if isinstance(self.label_ids, tuple) or isinstance(other.label_ids, tuple):
+            return set(self.iter_label_ids()) == set(other.iter_label_ids())
+        return self.label_ids == other.label_ids
 
+    def __hash__(self):
+        # the labels may still grow (overlaps), so only the location is hashed
+        # equal items always share their location, which keeps the hash consistent with __eq__
+        return hash((self.sentence, self.word1, self.word2))
+
+    def __reduce__(self):
+        return Item, (self.sentence, self.word1, self.word2, self.label_ids)
+
+
+class Leaf(list):
+    """the labelled items of a word pair in the nuclei trie, in insertion order
+    indexes the positions of the items by label and, for the sentence inserted last, by head,
+    so that an insertion does not have to look at the items of the other labels and sentences"""
+    __slots__ = ('labels', 'sentence', 'heads')
 
-class Trie(dict):
-    """implementation of a dictionary storing word pairs trie-wise"""
     def __init__(self):
+        super(Leaf, self).__init__()
+        self.labels = dict()
+        self.sentence = -1
+        self.heads = dict()
+
+    def add(self, item: Item, candidates: list = None):
+        """inserts a labelled item, merges its label into the overlapping items
+        returns the variation nuclei found with the other items (in their order) together with their number
+        if candidates (a subset of the items) are given, the variation nuclei are only formed with them,
+        the number still counts all of them"""
+        label = item.label_ids
+        labels = self.labels
+        overlaps = self.find_overlaps(item)
+        for position in overlaps:
+            other_item = self[position]
+            if not other_item.has_label(label):
+                other_item.add_label(label)
+                insort(labels.setdefault(label, []), position)
+
+        # overlapping items carry the label now, so they are excluded as well
+        count = len(self) - len(labels.get(label, ()))
+        variation_nucleus = list()
+        if candidates is None:
+            if count:
+                variation_nucleus = [(item, self[position]) for position in self.positions_without(label)]
+        else:
+            for other_item in candidates:
+                if not other_item.has_label(label):
+                    variation_nucleus.append((item, other_item))
+
+        if not overlaps:
+            position = len(self)
+            self.append(item)
+            labels.setdefault(label, []).append(position)
+            if item.sentence == self.sentence:
+                self.heads.setdefault(item.head(), []).append(position)
+        return variation_nucleus, count
+
+    def find_overlaps(self, item: Item) -> list:
+        """returns the positions of the items sharing the sentence and the head with the item"""
+        if item.sentence == self.sentence:
+            return self.heads.get(item.head(), [])
+        if item.sentence > self.sentence:
+            # the items arrive sentence by sentence, the index only has to cover the current one
+            self.sentence = item.sentence
+            self.heads.clear()
+            return []
+        return [position for position, other_item in enumerate(self) if item.overlaps_with(other_item)]
+
+    def positions_without(self, label: int):
+        """yields the positions of the items not carrying the label in ascending order"""
+        lists = [positions for other_label, positions in self.labels.items() if other_label != label]
+        # items with overlaps are listed under each of their labels
+        merged = lists[0] if len(lists) == 1 else merge(*lists)
+        previous = -1
+        for position in merged:
+            if position != previous and not self[position].has_label(label):
+                yield position
+            previous = position
+
+
+class VariationNuclei(list):
+    """the raw variation nuclei, pairs of items, in the order they were found
+    indexes every distinct item by a row and every pair by the rows of its two items (first and second),
+    so that the heuristics read every item only once, however many pairs it is part of"""
+    __slots__ = ('items', 'rows', 'first', 'second', '_product')
+
+    def __init__(self):
+        super(VariationNuclei, self).__init__()
+        self.items = list()
+        self.first = array('i')
+        self.second = array('i')
+        self._create_rows()
+
+    def _create_rows(self):
+        # the rows by the ids of the items (which are kept alive by items), a new item gets the next row
+        self.rows = defaultdict()
+        self.rows.default_factory = self.rows.__len__
+        self.rows.update(zip(map(id, self.items), range(len(self.items))))
+        self._product = None
+
+    def add_items(self, items: list) -> array:
+        """returns the rows of the items, the new ones are appended to the distinct items"""
+        known = len(self.items)
+        rows = array('i', map(self.rows.__getitem__, map(id, items)))
+        if len(self.rows) > known:
+            # an item may occur several times, the new rows are numbered in the order of their first occurrence
+            self.items.extend(dict(compress(zip(rows, items), map(known.__le__, rows))).values())
+        return rows
+
+    def extend(self, variation_nuclei):
+        variation_nuclei = list(variation_nuclei)
+        super(VariationNuclei, self).extend(variation_nuclei)
+        rows = self.add_items(list(chain.from_iterable(variation_nuclei)))
+        self.first.extend(rows[0::2])
+        self.second.extend(rows[1::2])
+
+    def add_product(self, item: Item, others: list):
+        """appends the pairs of the item with each of the other items
+        the rows of the other items are looked up once for consecutive calls with the same list"""
+        super(VariationNuclei, self).extend(zip(repeat(item), others))
+        if self._product is None or self._product[0] is not others:
+            self._product = (others, self.add_items(others))
+        self.first.extend(repeat(self.add_items((item,))[0], len(others)))
+        self.second.extend(self._product[1])
+
+    def clear(self):
+        super(VariationNuclei, self).clear()
+        self.items.clear()
+        del self.first[:], self.second[:]
+        self._create_rows()
+
+    def __reduce__(self):
+        return VariationNuclei, (), (list(self), self.items, self.first, self.second)
+
+    def __setstate__(self, state):
+        variation_nuclei, self.items, self.first, self.second = state
+        super(VariationNuclei, self).extend(variation_nuclei)
+        self._create_rows()
+
+
+class Trie(dict):
+    """implementation of a dictionary storing word pairs trie-wise
+    with detect=False labelled items are only recorded,
+    the detection can be run later on by detect_variation_nuclei()"""
+    def __init__(self, detect: bool = True):
         super(Trie, self).__init__()
+        self.detect = detect
 
-    def add_item(self, word1: str, word2: str, sentence_id: int, word1_id: int, word2_id: int, label: str = None):
-        """ adds an item to the trie structure, returns a variation nucleus, if detected"""
+    def add_item(self, word1: int, word2: int, sentence_id: int, word1_id: int, word2_id: int, label=None):
+        """ adds an item to the trie structure, returns a variation nucleus, if detected
+        the label is given as string or interned id"""
         variation_nucleus = list()
         item = Item(sentence_id, word1_id, word2_id, label)
 
-        if word1 in self:
-            level2 = self[word1]
-            if word2 in level2:
+        level2 = self.get(word1)
+        if level2 is None:
+            level2 = self[word1] = dict()
+        items = level2.get(word2)
 
-                # NIL trie does not have to do this
-                add_it = True
-                if label:
-                    for other_item in level2[word2]:
-
-                        # handle overlap
-                        if item.overlaps_with(other_item):
-                            other_item.label.add(label)
-                            add_it = False
-                        else:
-                            # check for variation nuclei
-                            if label not in other_item.label:
-                                variation_nucleus.append((item, other_item))
-
-                if add_it:
-                    level2[word2].append(item)
-            else:
-                level2[word2] = [item]
-        else:
-            level2 = dict()
+        # NIL trie does not have to do this
+        if label is not None and self.detect:
+            if items is None:
+                items = level2[word2] = Leaf()
+            variation_nucleus, _ = items.add(item)
+        elif items is None:
             level2[word2] = [item]
-            self[word1] = level2
+        else:
+            items.append(item)
         return variation_nucleus
 
-    def find_pairs(self, word1: str, word2: str):
+    def merge(self, other):
+        """appends the items of another trie, items of word pairs known to both tries are concatenated"""
+        for word1, other_level2 in other.items():
+            level2 = self.get(word1)
+            if level2 is None:
+                self[word1] = other_level2
+                continue
+            for word2, items in other_level2.items():
+                if word2 in level2:
+                    level2[word2].extend(items)
+                else:
+                    level2[word2] = items
+
+    def to_columns(self) -> tuple:
+        """returns the items as compact arrays to send them to another process, see add_columns():
+        the first words with their number of second words, the second words with the len() of their items
+        and the flat columns of all items, (sentence, word1 id, word2 id, label id) for the labelled ones"""
+        words1 = array('i', self.keys())
+        sizes = array('i', map(len, self.values()))
+        words2, lengths = array('i'), array('i')
+        for level2 in self.values():
+            words2.extend(level2.keys())
+            lengths.extend(map(len, level2.values()))
+        return words1, sizes, words2, lengths, self.get_columns()
+
+    def get_columns(self) -> array:
+        """returns the flat columns of all items in the order of the trie, the recorded items have a single label"""
+        return array('i', chain.from_iterable((item.sentence, item.word1, item.word2, item.label_ids)
+                                              for level2 in self.values() for items in level2.values()
+                                              for item in items))
+
+    def add_columns(self, words1: array, sizes: array, words2: array, lengths: array, columns: array):
+        """appends the items of the arrays returned by to_columns() of another trie like merge() does"""
+        words2 = iter(words2)
+        values = self.split_columns(columns, lengths)
+        for word1, size in zip(words1, sizes):
+            level2 = self.get(word1)
+            if level2 is None:
+                self[word1] = dict(zip(islice(words2, size), islice(values, size)))
+                continue
+            for word2, items in zip(islice(words2, size), islice(values, size)):
+                if word2 in level2:
+                    level2[word2].extend(items)
+                else:
+                    level2[word2] = items
+
+    @staticmethod
+    def split_columns(columns: array, lengths: array):
+        """yields the items of every word pair from the columns of to_columns()"""
+        items = iter(columns)
+        items = map(Item, items, items, items, items)
+        for length in lengths:
+            yield list(islice(items, length))
+
+    def detect_variation_nuclei(self, key=None):
+        """runs the detection of add_item() on the recorded items
+        returns the variation nuclei in the same order as they would have been found while adding the items,
+        together with their number
+        if a key function is given, variation nuclei are only formed between items with equal keys (hash join),
+        items with the key None are not paired at all; the number still counts all variation nuclei"""
+        found = dict()
+        count = 0
+        for level2 in self.values():
+            for word2, recorded in level2.items():
+                items = Leaf()
+                buckets = dict()
+                for item in recorded:
+                    candidates = None
+                    if key:
+                        item_key = key(item)
+                        candidates = buckets.get(item_key, ()) if item_key is not None else ()
+
+                    count += self._record(items, item, found, candidates)
+
+                    if key and item_key is not None and items and items[-1] is item:
+                        buckets.setdefault(item_key, []).append(item)
+                level2[word2] = items
+
+        return self.order_variation_nuclei(found), count
+
+    def add_trie(self, other):
+        """adds the items recorded by another trie (with detect=False), which belong to later sentences,
+        and runs the detection on them like detect_variation_nuclei() does; the items are paired with all items
+        returns the new variation nuclei in the order they would have been found while adding the items,
+        together with their number"""
+        found = dict()
+        count = 0
+        for word1, other_level2 in other.items():
+            level2 = self.get(word1)
+            if level2 is None:
+                level2 = self[word1] = dict()
+            for word2, recorded in other_level2.items():
+                items = level2.get(word2)
+                if items is None:
+                    items = level2[word2] = Leaf()
+                for item in recorded:
+                    count += self._record(items, item, found)
+        return self.order_variation_nuclei(found), count
+
+    @staticmethod
+    def _record(items: Leaf, item: Item, found: dict, candidates: list = None) -> int:
+        """adds a recorded item to the items of its word pair, the variation nuclei it forms are kept in found
+        under the dependent token of the item (see order_variation_nuclei()), returns their number (see Leaf.add())"""
+        variation_nucleus, count = items.add(item, candidates)
+        if variation_nucleus:
+            # the dependent of the pair is the token whose dependency added the item
+            dependent = item.word2 if item.head() == item.word1 else item.word1
+            found[(item.sentence, dependent)] = variation_nucleus
+        return count
+
+    @staticmethod
+    def order_variation_nuclei(found: dict) -> list:
+        """concatenates the variation nuclei found per (sentence, dependent token) in the order of the tokens"""
+        variation_nuclei = list()
+        for token in sorted(found):
+            variation_nuclei.extend(found[token])
+        return variation_nuclei
+
+    def find_pairs(self, word1: int, word2: int):
         """ searches for a word pair in the trie and returns the corresponding items"""
         items = []
         if word1 in self:
@@ -115,3 +413,57 @@ class Trie(dict):
             if word2 in level2:
                 items = level2[word2]
         return items
+
+
+class NilTrie(Trie):
+    """trie for the NIL items, which consist of their location indices only
+    the items of a word pair are stored in bulk as one flat array (sentence, word1, word2, sentence, ...)
+    and only turned into Item objects when they are looked up"""
+    def __init__(self):
+        super(NilTrie, self).__init__(detect=False)
+
+    def add_item(self, word1: int, word2: int, sentence_id: int, word1_id: int, word2_id: int, label=None):
+        """ adds a NIL item to the trie structure"""
+        level2 = self.get(word1)
+        if level2 is None:
+            level2 = self[word1] = dict()
+        items = level2.get(word2)
+        if items is None:
+            items = level2[word2] = array('i')
+        items.extend((sentence_id, word1_id, word2_id))
+        return []
+
+    def find_pairs(self, word1: int, word2: int, first: int = 0):
+        """ searches for a word pair in the trie and returns the corresponding items (from the given position on)"""
+        items = []
+        if word1 in self:
+            level2 = self[word1]
+            if word2 in level2:
+                indices = level2[word2]
+                indices = iter(indices[3 * first:] if first else indices)
+                items = [Item(sentence, w1, w2) for sentence, w1, w2 in zip(indices, indices, indices)]
+        return items
+
+    def get_columns(self) -> array:
+        """returns the flat locations of all items in the order of the trie"""
+        columns = array('i')
+        for level2 in self.values():
+            columns.frombytes(b''.join(map(array.tobytes, level2.values())))
+        return columns
+
+    @staticmethod
+    def split_columns(columns: array, lengths: array):
+        """returns the items of every word pair as slices of the columns"""
+        bounds = list(accumulate(lengths, initial=0))
+        return map(columns.__getitem__, map(slice, bounds, islice(bounds, 1, None)))
+
+    def count_pairs(self, word1: int, word2: int) -> int:
+        """returns the number of items of a word pair"""
+        level2 = self.get(word1)
+        if level2 is None or word2 not in level2:
+            return 0
+        return len(level2[word2]) // 3
+
+    def count(self) -> int:
+        """returns the number of NIL items"""
+        return sum(len(items) for level2 in self.values() for items in level2.values()) // 3